@@ -44,6 +44,10 @@ export OPENAI_MODEL="${CODER_MODEL_NAME:-unsloth/Qwen3.5-397B-A17B-GGUF}"
 export VLM_BASE_URL="https://${MODAL_WORKSPACE}--coding-agent-server-serve-vlm.modal.run/v1"
 export VLM_MODEL="Qwen/Qwen3-VL-32B-Thinking-FP8"
 
+# Shared VLM MCP daemon (./run.sh vlm-daemon, registered with ./run.sh install --daemon)
+export VLM_MCP_HOST="${VLM_MCP_HOST:-127.0.0.1}"
+export VLM_MCP_PORT="${VLM_MCP_PORT:-8765}"
+
 # Proxy auth tokens (required for authenticated endpoints)
 export MODAL_PROXY_TOKEN_ID="${MODAL_PROXY_TOKEN_ID:-}"
 export MODAL_PROXY_TOKEN_SECRET="${MODAL_PROXY_TOKEN_SECRET:-}"
@@ -76,11 +80,32 @@ case "$CMD" in
         echo "Running smoke test (modal run)..."
         "$VENV_DIR/bin/modal" run "$SCRIPT_DIR/src/coding_agent_server/deploy.py" "$@"
         ;;
+    prewarm)
+        ensure_modal_token
+        TARGET="$1"
+        if [ "$TARGET" != "coder" ] && [ "$TARGET" != "vlm" ]; then
+            echo "Usage: ./run.sh prewarm coder|vlm [--bench]" >&2
+            exit 1
+        fi
+        shift
+        echo "Pre-warming the $TARGET compile cache on the volume..."
+        "$VENV_DIR/bin/modal" run "$SCRIPT_DIR/src/coding_agent_server/deploy.py::prewarm_$TARGET" "$@"
+        ;;
+    bench-cold-start)
+        ensure_modal_token
+        echo "Measuring scale-from-zero time-to-first-token (stops running containers)..."
+        "$VENV_DIR/bin/python" "$SCRIPT_DIR/scripts/bench_cold_start.py" "$@"
+        ;;
     logs)
         ensure_modal_token
         "$VENV_DIR/bin/modal" app logs coding-agent-server "$@"
         ;;
     install)
+        MCP_DAEMON=0
+        if [ "$1" = "--daemon" ]; then
+            MCP_DAEMON=1
+        fi
+
         # Ensure npm is available (qwen-code installer requires it)
         if ! command -v npm &>/dev/null; then
             echo "Error: npm is required but not installed." >&2
@@ -114,7 +139,7 @@ EOF
         # Install MCP server dependencies into project venv
         echo ""
         echo "Installing VLM MCP server dependencies..."
-        "$VENV_DIR/bin/pip" install --quiet "mcp[cli]" httpx
+        "$VENV_DIR/bin/pip" install --quiet "mcp[cli]" "httpx[http2]" pillow numpy
 
         # Register vlm-analyzer MCP server in qwen-code settings
         echo "Registering vlm-analyzer MCP server..."
@@ -134,6 +159,8 @@ mcp_script = '$MCP_SERVER_SCRIPT'
 venv_python = '$VENV_PYTHON'
 proxy_token_id = '$MODAL_PROXY_TOKEN_ID'
 proxy_token_secret = '$MODAL_PROXY_TOKEN_SECRET'
+mcp_daemon = '$MCP_DAEMON' == '1'
+mcp_url = 'http://$VLM_MCP_HOST:$VLM_MCP_PORT/mcp'
 
 # Load existing or start fresh
 if os.path.exists(settings_file):
@@ -151,11 +178,15 @@ mcp_env = {
 if proxy_token_id and proxy_token_secret:
     mcp_env['MODAL_PROXY_TOKEN_ID'] = proxy_token_id
     mcp_env['MODAL_PROXY_TOKEN_SECRET'] = proxy_token_secret
-mcp_servers['vlm-analyzer'] = {
-    'command': venv_python,
-    'args': [mcp_script],
-    'env': mcp_env,
-}
+if mcp_daemon:
+    # One shared daemon (./run.sh vlm-daemon) serves every session; it reads its env itself
+    mcp_servers['vlm-analyzer'] = {'httpUrl': mcp_url}
+else:
+    mcp_servers['vlm-analyzer'] = {
+        'command': venv_python,
+        'args': [mcp_script],
+        'env': mcp_env,
+    }
 
 # Add customHeaders for Modal proxy auth (used by qwen-code OpenAI client)
 if proxy_token_id and proxy_token_secret:
@@ -170,6 +201,8 @@ with open(settings_file, 'w') as f:
     json.dump(d, f, indent=2)
 
 print(f'Registered vlm-analyzer MCP server in {settings_file}')
+if mcp_daemon:
+    print(f'  Daemon URL: {mcp_url}')
 if proxy_token_id and proxy_token_secret:
     print('Configured Modal proxy auth headers in customHeaders')
 else:
@@ -179,6 +212,16 @@ else:
         echo ""
         echo "Run 'qodal' from any directory to use qwen-code with the Modal endpoint."
         echo "VLM MCP server (vlm-analyzer) is registered and will be available in qwen-code."
+        if [ "$MCP_DAEMON" = "1" ]; then
+            echo "Start the shared daemon before launching qwen-code: ./run.sh vlm-daemon"
+        fi
+        ;;
+    vlm-daemon)
+        echo "Serving vlm-analyzer on http://$VLM_MCP_HOST:$VLM_MCP_PORT/mcp"
+        echo "VLM endpoint: $VLM_BASE_URL"
+        VLM_ENDPOINT="$VLM_BASE_URL" \
+        VLM_MCP_TRANSPORT=streamable-http \
+            exec "$VENV_DIR/bin/python" "$SCRIPT_DIR/src/coding_agent_server/vlm_mcp_server.py" "$@"
         ;;
     qwen)
         echo "Endpoint: $OPENAI_BASE_URL"
@@ -214,8 +257,14 @@ else:
         echo "  download-models  Download model weights to Modal Volume (run first)"
         echo "  deploy           Deploy the server to Modal (coder + VLM)"
         echo "  install          Install qwen-code + 'qodal' wrapper + VLM MCP server"
+        echo "                   (--daemon: register the shared vlm-daemon URL instead)"
+        echo "  vlm-daemon       Run one VLM MCP server over HTTP for all qwen-code sessions"
         echo "  smoke            Run smoke test via modal run"
         echo "  logs             Tail Modal app logs"
+        echo "  prewarm          Compile vLLM's kernels/CUDA graphs once into the volume cache"
+        echo "                   (coder|vlm; --bench: decode tok/s with vs without graphs)"
+        echo "  bench-cold-start Scale-from-zero TTFT, p50/p95 per cold-start phase"
+        echo "                   (--target coder|vlm, --runs N)"
         echo "  qwen             Launch qwen-code CLI with endpoint configured"
         echo "  test             Run pytest health checks against live endpoints"
         echo "  env              Print configured env vars (coder + VLM)"
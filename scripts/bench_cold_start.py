@@ -0,0 +1,152 @@
+"""Scale-from-zero time-to-first-token benchmark for the deployed endpoints.
+
+Each run stops every running container of the app, sends one streamed chat
+completion, and times the first streamed token. It then reads the cold-start
+timeline that the new container wrote to the volume (see StartupTimeline in
+supervisor.py) and splits the TTFT into phases:
+
+    scheduling   - request sent to container start (function start where /proc
+                   is unavailable): Modal placing and booting the container
+    <engine>     - the container's own phases: volume_ready, engine_spawned,
+                   weights_loaded, ..., ready
+    first_token  - engine ready to first streamed token at the client
+
+Client and container timestamps come from different clocks, so scheduling
+and first_token absorb any skew between them.
+
+Usage:
+    ./run.sh bench-cold-start [--target coder|vlm] [--runs 5]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+import modal
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "coding_agent_server"))
+from config import APP_NAME, MODEL_NAME, VLM_MODEL_NAME, VOLUME_NAME  # noqa: E402
+
+TIMELINE_DIR = ".timelines"  # relative to the volume root
+REQUEST_TIMEOUT = 900  # seconds; a vLLM cold start takes several minutes
+CLOCK_SLACK = 5.0  # seconds a container's clock may run behind ours when matching its timeline
+STOP_WAIT = 120  # seconds to wait for stopped containers to go away
+
+
+def _modal(*args: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-m", "modal", *args], check=True, capture_output=True, text=True
+    ).stdout
+
+
+def _app_containers() -> list[str]:
+    containers = json.loads(_modal("container", "list", "--json") or "[]")
+    return [c["Container ID"] for c in containers if c.get("App Name") == APP_NAME]
+
+
+def _scale_to_zero() -> None:
+    """Stop every container of the app and wait until none is left."""
+    for container_id in _app_containers():
+        _modal("container", "stop", container_id)
+    deadline = time.monotonic() + STOP_WAIT
+    while _app_containers():
+        if time.monotonic() > deadline:
+            sys.exit(f"Containers of {APP_NAME} still running after {STOP_WAIT}s")
+        time.sleep(2)
+
+
+async def _time_to_first_token(url: str, model: str) -> float:
+    """Send one streamed completion; return the wall time its first token arrived."""
+    headers = {"Content-Type": "application/json", "Accept": "text/event-stream"}
+    if os.environ.get("MODAL_PROXY_TOKEN_ID"):
+        headers["Modal-Key"] = os.environ["MODAL_PROXY_TOKEN_ID"]
+        headers["Modal-Secret"] = os.environ.get("MODAL_PROXY_TOKEN_SECRET", "")
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": "Say hello."}],
+        "stream": True,
+        "max_tokens": 16,
+    }
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.post(f"{url}/v1/chat/completions", json=payload, headers=headers) as resp:
+            resp.raise_for_status()
+            async for raw in resp.content:
+                line = raw.decode().strip()
+                if not line.startswith("data: ") or line == "data: [DONE]":
+                    continue
+                delta = json.loads(line[len("data: "):])["choices"][0]["delta"]
+                if delta.get("content") or delta.get("reasoning_content") or delta.get("reasoning"):
+                    return time.time()
+    raise RuntimeError("stream ended without a token")
+
+
+def _find_timeline(volume: modal.Volume, target: str, sent: float) -> dict | None:
+    """The earliest timeline of `target` whose container started after the request was sent."""
+    timelines = []
+    for entry in volume.listdir(f"{TIMELINE_DIR}/{target}"):
+        timeline = json.loads(b"".join(volume.read_file(entry.path)))
+        if timeline["marks"]["function_start"] >= sent - CLOCK_SLACK:
+            timelines.append(timeline)
+    return min(timelines, key=lambda t: t["marks"]["function_start"], default=None)
+
+
+def _run_phases(sent: float, first_token: float, timeline: dict | None) -> dict[str, float]:
+    if timeline is None:
+        return {"total": first_token - sent}
+    marks = timeline["marks"]
+    return {
+        "scheduling": marks.get("container_start", marks["function_start"]) - sent,
+        **timeline["phases"],
+        "first_token": first_token - marks["ready"],
+        "total": first_token - sent,
+    }
+
+
+def _percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * p / 100) - 1)]
+
+
+def _report(runs: list[dict[str, float]]) -> None:
+    names: list[str] = []
+    for phases in runs:
+        names += [name for name in phases if name not in names]
+    print(f"\n{'phase':<22}{'n':>4}{'p50 s':>10}{'p95 s':>10}")
+    for name in names:
+        values = [phases[name] for phases in runs if name in phases]
+        print(f"{name:<22}{len(values):>4}{_percentile(values, 50):>10.2f}{_percentile(values, 95):>10.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["coder", "vlm"], default="coder")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    url = modal.Function.from_name(APP_NAME, f"serve_{args.target}").get_web_url()
+    model = MODEL_NAME if args.target == "coder" else VLM_MODEL_NAME
+    volume = modal.Volume.from_name(VOLUME_NAME)
+
+    runs = []
+    for i in range(args.runs):
+        _scale_to_zero()
+        sent = time.time()
+        first_token = asyncio.run(_time_to_first_token(url, model))
+        phases = _run_phases(sent, first_token, _find_timeline(volume, args.target, sent))
+        runs.append(phases)
+        print(f"run {i + 1}/{args.runs}: TTFT {phases['total']:.1f}s " + json.dumps(
+            {name: round(seconds, 1) for name, seconds in phases.items() if name != "total"}
+        ))
+    _report(runs)
+
+
+if __name__ == "__main__":
+    main()
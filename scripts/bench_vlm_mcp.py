@@ -0,0 +1,487 @@
+"""Local micro-benchmarks for the VLM MCP server.
+
+Runs the MCP server's request path against an in-process stand-in for the
+Modal-proxied vLLM endpoint, so no GPU or Modal account is needed.
+
+Usage:
+    python scripts/bench_vlm_mcp.py pool [--calls 50] [--handshake-ms 40]
+    python scripts/bench_vlm_mcp.py stream [--tokens 400] [--token-ms 10]
+    python scripts/bench_vlm_mcp.py memory [--images 5] [--size 2000]
+    python scripts/bench_vlm_mcp.py near-dup [--service-ms 200]
+    python scripts/bench_vlm_mcp.py throughput [--calls 32] [--size 1600]
+
+Benchmarks:
+    pool  - per-call client (old behaviour) vs the shared pooled client.
+            The stand-in sleeps --handshake-ms on every new connection to
+            model the TCP+TLS setup cost of reaching the Modal proxy.
+    stream - time to first MCP progress notification vs full generation
+            time for a streamed Thinking-style reply.
+    memory - tracemalloc peak while sending --images large noise PNGs as one
+            request: fully buffered body (old behaviour) vs the streaming
+            body writer, at a few chunk sizes.
+    near-dup - exact-hash cache vs the perceptual near-duplicate cache at
+            several Hamming thresholds, on the synthetic images from
+            tests/test_vlm_mcp.py plus "blinking cursor" / "timestamp"
+            variants of each. Reports upstream calls, hits on variants
+            (wanted) and hits on distinct images (false positives).
+    throughput - --calls concurrent analyze_image calls on distinct images
+            that all need downscaling: image work inline on the event loop
+            (old behaviour) vs the image worker pool at 1, 2, 4, ... workers
+            up to the CPU count. Reports calls/s and the longest event-loop
+            stall, i.e. how long other MCP messages could have been blocked.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "coding_agent_server"))
+sys.path.insert(0, str(ROOT / "tests"))
+import test_vlm_mcp as synthetic  # noqa: E402  (image generators)
+import vlm_mcp_server  # noqa: E402
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logging.getLogger("vlm_mcp_server").setLevel(logging.WARNING)
+
+# --- Stand-in VLM endpoint ---
+
+MAX_KEPT_BODY = 1024 * 1024
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible /v1/chat/completions and /health responder.
+
+    Streams `server.reply_tokens` as SSE chunks (chunked transfer encoding,
+    `server.token_ms` apart) when the request sets `stream`, otherwise returns
+    a single JSON completion.
+    """
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real proxy
+    disable_nagle_algorithm = True  # avoid 40ms delayed-ACK stalls skewing timings
+
+    def do_GET(self):
+        self.send_response(200 if self.path == "/health" else 404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _read_body(self) -> bytes | None:
+        """Read the request body in small pieces; large bodies are discarded, not buffered.
+
+        Handles both Content-Length and chunked (streamed) uploads. Returns
+        None if the body exceeded MAX_KEPT_BODY, so the stand-in itself never
+        holds a large payload in memory during the memory benchmark.
+        """
+        kept: list[bytes] = []
+        size = 0
+
+        def consume(n: int) -> None:
+            nonlocal size
+            while n:
+                piece = self.rfile.read(min(n, 64 * 1024))
+                n -= len(piece)
+                size += len(piece)
+                if size <= MAX_KEPT_BODY:
+                    kept.append(piece)
+
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while (n := int(self.rfile.readline().split(b";")[0], 16)):
+                consume(n)
+                self.rfile.readline()  # CRLF after each chunk
+            self.rfile.readline()  # final CRLF
+        else:
+            consume(int(self.headers.get("Content-Length", "0")))
+        self.server.bytes_received += size
+        return b"".join(kept) if size <= MAX_KEPT_BODY else None
+
+    def do_POST(self):
+        body = self._read_body()
+        request = json.loads(body or b"{}") if body is not None else {"stream": True}
+        self.server.requests += 1
+        time.sleep(self.server.service_ms / 1000)
+        tokens = self.server.reply_tokens
+
+        if not request.get("stream"):
+            body = json.dumps({"choices": [{"message": {"content": "".join(tokens)}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.server.token_ms / 1000)
+            finish = "stop" if i == len(tokens) - 1 else None
+            event = {"choices": [{"index": 0, "delta": {"content": token}, "finish_reason": finish}]}
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Threaded HTTP server that charges a fixed delay per new connection."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        handshake_ms: float = 0.0,
+        service_ms: float = 0.0,
+        reply_tokens: list[str] | None = None,
+        token_ms: float = 0.0,
+    ):
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.handshake_ms = handshake_ms
+        self.service_ms = service_ms
+        self.reply_tokens = reply_tokens or ["ok"]
+        self.token_ms = token_ms
+        self.connections = 0
+        self.requests = 0
+        self.bytes_received = 0
+
+    def get_request(self):
+        conn, addr = super().get_request()
+        self.connections += 1
+        time.sleep(self.handshake_ms / 1000)
+        return conn, addr
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def _summary(label: str, samples: list[float]) -> str:
+    ms = sorted(s * 1000 for s in samples)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    return f"  {label:<28} mean={statistics.mean(ms):7.2f}ms  p50={statistics.median(ms):7.2f}ms  p95={p95:7.2f}ms"
+
+
+# --- Benchmarks ---
+
+
+async def bench_pool(calls: int, handshake_ms: float, service_ms: float) -> None:
+    content = [{"type": "text", "text": "ping"}]
+    payload = {
+        "model": vlm_mcp_server.VLM_MODEL,
+        "messages": [{"role": "user", "content": content}],
+        "max_tokens": 8,
+        "stream": True,
+    }
+
+    with StandInServer(handshake_ms, service_ms) as server:
+        vlm_mcp_server._router = vlm_mcp_server.EndpointRouter([server.url])
+        vlm_mcp_server.VLM_CACHE = False  # every call must reach the stand-in
+
+        per_call = []
+        for _ in range(calls):
+            t0 = time.perf_counter()
+            async with httpx.AsyncClient(timeout=vlm_mcp_server.VLM_TIMEOUT) as client:
+                async with client.stream("POST", f"{server.url}/chat/completions", json=payload) as resp:
+                    resp.raise_for_status()
+                    await vlm_mcp_server._read_sse_completion(resp)
+            per_call.append(time.perf_counter() - t0)
+        per_call_conns = server.connections
+
+        server.connections = 0
+        pooled = []
+        async with vlm_mcp_server._lifespan(vlm_mcp_server.mcp):
+            for _ in range(calls):
+                t0 = time.perf_counter()
+                await vlm_mcp_server._vlm_request(content, max_tokens=8)
+                pooled.append(time.perf_counter() - t0)
+        pooled_conns = server.connections
+
+    print(f"pool: {calls} sequential calls, handshake={handshake_ms}ms, service={service_ms}ms")
+    print(_summary(f"per-call client ({per_call_conns} conns)", per_call))
+    print(_summary(f"shared pool ({pooled_conns} conns)", pooled))
+    saved = statistics.mean(per_call) - statistics.mean(pooled)
+    print(f"  saved per call:              {saved * 1000:.2f}ms")
+
+
+async def bench_stream(tokens: int, token_ms: float) -> None:
+    reasoning = ["hmm "] * (tokens * 3 // 4)
+    answer = ["ok "] * (tokens - len(reasoning))
+    reply = reasoning + ["</think>\n\n"] + answer
+    first_progress: list[float] = []
+
+    async def on_progress(n: int, phase: str) -> None:
+        if not first_progress:
+            first_progress.append(time.perf_counter())
+
+    with StandInServer(reply_tokens=reply, token_ms=token_ms) as server:
+        vlm_mcp_server._router = vlm_mcp_server.EndpointRouter([server.url])
+        vlm_mcp_server.VLM_CACHE = False
+        async with vlm_mcp_server._lifespan(vlm_mcp_server.mcp):
+            await vlm_mcp_server._vlm_request([{"type": "text", "text": "warm"}], max_tokens=8)
+            t0 = time.perf_counter()
+            await vlm_mcp_server._vlm_request([{"type": "text", "text": "ping"}], on_progress=on_progress)
+            total = time.perf_counter() - t0
+
+    print(f"stream: {len(reply)} tokens at {token_ms}ms/token")
+    print(f"  time to first progress: {(first_progress[0] - t0) * 1000:8.2f}ms")
+    print(f"  full generation:        {total * 1000:8.2f}ms")
+
+
+async def bench_memory(n_images: int, size: int) -> None:
+    tmp = Path(tempfile.mkdtemp(prefix="vlm-bench-"))
+    paths = []
+    for i in range(n_images):
+        path = tmp / f"noise_{i}.png"
+        Image.frombytes("RGB", (size, size), os.urandom(size * size * 3)).save(path)
+        paths.append(str(path))
+    total_mb = sum(Path(p).stat().st_size for p in paths) / 1e6
+    prompt = [{"type": "text", "text": "compare"}]
+
+    def buffered_payload() -> dict:
+        content = []
+        for p in paths:
+            data = base64.b64encode(Path(p).read_bytes()).decode("ascii")
+            content.append(vlm_mcp_server._image_content_block("image/png", data))
+        return {
+            "model": vlm_mcp_server.VLM_MODEL,
+            "messages": [{"role": "user", "content": content + prompt}],
+            "max_tokens": 8,
+            "stream": True,
+        }
+
+    async def measure(send) -> float:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        await send()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak / 1e6
+
+    with StandInServer() as server:
+        vlm_mcp_server._router = vlm_mcp_server.EndpointRouter([server.url])
+        vlm_mcp_server.VLM_CACHE = False
+        vlm_mcp_server.VLM_STREAM_THRESHOLD_MB = 0  # stream every unresized image
+        async with vlm_mcp_server._lifespan(vlm_mcp_server.mcp):
+            await vlm_mcp_server._vlm_request(prompt, max_tokens=8)  # warm connection + health
+
+            async def send_buffered():
+                body = json.dumps(buffered_payload()).encode()
+                client = vlm_mcp_server._get_http_client()
+                async with client.stream("POST", f"{server.url}/chat/completions", content=body) as resp:
+                    await vlm_mcp_server._read_sse_completion(resp)
+
+            results = [("buffered json body", await measure(send_buffered))]
+            for chunk_kb in (64, 768, 4096):
+                vlm_mcp_server.VLM_BODY_CHUNK_BYTES = chunk_kb * 1024 // 3 * 3
+                vlm_mcp_server._image_memo = vlm_mcp_server.EncodedImageMemo(
+                    int(vlm_mcp_server.VLM_IMAGE_MEMO_MB * 1024 * 1024)
+                )
+
+                async def send_streamed():
+                    images = [vlm_mcp_server._encode_image(p) for p in paths]
+                    await vlm_mcp_server._vlm_request(
+                        [img.content_block() for img in images] + prompt, max_tokens=8
+                    )
+
+                results.append((f"streamed, {chunk_kb} KB chunks", await measure(send_streamed)))
+
+    for p in paths:
+        Path(p).unlink()
+    tmp.rmdir()
+    print(f"memory: {n_images} images, {total_mb:.1f} MB on disk")
+    for label, peak in results:
+        print(f"  {label:<28} peak={peak:8.1f} MB")
+
+
+def _near_dup_corpus() -> list[tuple[Path, list[Path]]]:
+    """Distinct synthetic images, each with two near-duplicate variants."""
+    bases = [
+        *(synthetic.generate_triangle_image(color) for color in ("blue", "red", "green")),
+        *(synthetic.generate_suit_symbol(suit, "purple") for suit in ("diamond", "square")),
+        *(synthetic.generate_color_block(color) for color in ("red", "blue", "yellow")),
+        *(synthetic.generate_wingdings_style_symbol(kind, "darkgreen") for kind in ("check", "cross", "star", "heart")),
+    ]
+    corpus = []
+    for base in bases:
+        with Image.open(base) as img:
+            flat = Image.new("RGB", img.size, "white")
+            flat.paste(img, mask=img.getchannel("A") if img.mode == "RGBA" else None)
+        flat.save(base)  # transparent symbols become dark-on-white, like a screenshot
+        variants = []
+        for kind in ("cursor", "timestamp"):
+            img = flat.copy()
+            draw = ImageDraw.Draw(img)
+            if kind == "cursor":
+                draw.rectangle((200, 30, 201, 44), fill="black")
+            else:
+                draw.text((4, 242), time.strftime("%H:%M:%S"), fill="gray")
+            path = base.with_name(f"{base.stem}_{kind}.png")
+            img.save(path)
+            variants.append(path)
+        corpus.append((base, variants))
+    return corpus
+
+
+async def bench_near_dup(service_ms: float) -> None:
+    corpus = _near_dup_corpus()
+    prompt = "Describe this image."
+    rows = []
+    with StandInServer(service_ms=service_ms) as server:
+        vlm_mcp_server._router = vlm_mcp_server.EndpointRouter([server.url])
+        vlm_mcp_server.VLM_CACHE = True
+        async with vlm_mcp_server._lifespan(vlm_mcp_server.mcp):
+            for distance in (None, 0, 2, 4, 8, 12):
+                vlm_mcp_server.VLM_NEAR_DUP = distance is not None
+                vlm_mcp_server._response_cache = vlm_mcp_server.ResponseCache(max_entries=256, ttl=3600)
+                vlm_mcp_server._near_index = vlm_mcp_server.NearDuplicateIndex(distance or 0, 256)
+                vlm_mcp_server._image_memo = vlm_mcp_server.EncodedImageMemo(64 << 20)
+                start_requests = server.requests
+                false_hits = variant_hits = 0
+                t0 = time.perf_counter()
+                for base, variants in corpus:
+                    before = vlm_mcp_server._near_index.hits
+                    await vlm_mcp_server.analyze_image(str(base), prompt)
+                    false_hits += vlm_mcp_server._near_index.hits - before
+                    for variant in variants:
+                        before = vlm_mcp_server._near_index.hits
+                        await vlm_mcp_server.analyze_image(str(variant), prompt)
+                        variant_hits += vlm_mcp_server._near_index.hits - before
+                elapsed = time.perf_counter() - t0
+                calls = len(corpus) * 3
+                label = "exact hash only" if distance is None else f"near-dup, distance<={distance}"
+                rows.append((label, server.requests - start_requests, variant_hits, false_hits, elapsed / calls))
+
+    for base, variants in corpus:
+        for path in (base, *variants):
+            path.unlink(missing_ok=True)
+    n_variants = sum(len(v) for _, v in corpus)
+    print(f"near-dup: {len(corpus)} distinct images + {n_variants} variants, service={service_ms}ms")
+    for label, upstream, variant_hits, false_hits, per_call in rows:
+        print(
+            f"  {label:<26} upstream={upstream:3d}  variant hits={variant_hits:2d}/{n_variants}"
+            f"  false hits={false_hits:2d}  mean={per_call * 1000:7.2f}ms/call"
+        )
+
+
+async def bench_throughput(calls: int, size: int, service_ms: float) -> None:
+    tmp = Path(tempfile.mkdtemp(prefix="vlm-bench-"))
+    paths = []
+    for i in range(calls):
+        path = tmp / f"shot_{i}.png"
+        Image.frombytes("RGB", (size, size), os.urandom(size * size * 3)).save(path)
+        paths.append(str(path))
+
+    async def inline(fn, *args):
+        return fn(*args)
+
+    cpus = os.cpu_count() or 1
+    workers = sorted({n for n in (1, 2, 4, 8) if n <= cpus} | {cpus})
+    rows = []
+    with StandInServer(service_ms=service_ms) as server:
+        vlm_mcp_server._router = vlm_mcp_server.EndpointRouter([server.url])
+        vlm_mcp_server.VLM_CACHE = False
+        pool_fn = vlm_mcp_server._in_image_pool
+        for n in [None, *workers]:
+            vlm_mcp_server.VLM_IMAGE_WORKERS = n or 1
+            vlm_mcp_server._image_pool = vlm_mcp_server.ThreadPoolExecutor(n or 1)
+            vlm_mcp_server._in_image_pool = inline if n is None else pool_fn
+            vlm_mcp_server._image_memo = vlm_mcp_server.EncodedImageMemo(64 << 20)
+            async with vlm_mcp_server._lifespan(vlm_mcp_server.mcp):
+                stalls = [0.0]
+                done = asyncio.Event()
+
+                async def ticker():
+                    while not done.is_set():
+                        t = time.perf_counter()
+                        await asyncio.sleep(0.005)
+                        stalls.append(time.perf_counter() - t - 0.005)
+
+                tick = asyncio.create_task(ticker())
+                t0 = time.perf_counter()
+                await asyncio.gather(*(vlm_mcp_server.analyze_image(p, "describe", detail="low") for p in paths))
+                elapsed = time.perf_counter() - t0
+                done.set()
+                await tick
+            vlm_mcp_server._image_pool.shutdown()
+            label = "inline on event loop" if n is None else f"worker pool, {n} worker(s)"
+            rows.append((label, calls / elapsed, max(stalls)))
+        vlm_mcp_server._in_image_pool = pool_fn
+
+    for p in paths:
+        Path(p).unlink()
+    tmp.rmdir()
+    print(f"throughput: {calls} concurrent analyze_image calls, {size}x{size} PNGs, {cpus} CPU(s)")
+    for label, rate, stall in rows:
+        print(f"  {label:<28} {rate:7.1f} calls/s  max loop stall={stall * 1000:8.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    pool = sub.add_parser("pool", help="per-call client vs shared pooled client")
+    pool.add_argument("--calls", type=int, default=50)
+    pool.add_argument("--handshake-ms", type=float, default=40.0)
+    pool.add_argument("--service-ms", type=float, default=5.0)
+
+    stream = sub.add_parser("stream", help="time to first progress vs full generation")
+    stream.add_argument("--tokens", type=int, default=400)
+    stream.add_argument("--token-ms", type=float, default=10.0)
+
+    memory = sub.add_parser("memory", help="peak memory: buffered vs streamed request body")
+    memory.add_argument("--images", type=int, default=5)
+    memory.add_argument("--size", type=int, default=2000, help="image side in pixels")
+
+    near_dup = sub.add_parser("near-dup", help="exact vs perceptual near-duplicate cache")
+    near_dup.add_argument("--service-ms", type=float, default=200.0)
+
+    throughput = sub.add_parser("throughput", help="concurrent tool calls: inline vs image worker pool")
+    throughput.add_argument("--calls", type=int, default=32)
+    throughput.add_argument("--size", type=int, default=1600, help="image side in pixels")
+    throughput.add_argument("--service-ms", type=float, default=5.0)
+
+    args = parser.parse_args()
+    if args.bench == "pool":
+        asyncio.run(bench_pool(args.calls, args.handshake_ms, args.service_ms))
+    elif args.bench == "stream":
+        asyncio.run(bench_stream(args.tokens, args.token_ms))
+    elif args.bench == "memory":
+        asyncio.run(bench_memory(args.images, args.size))
+    elif args.bench == "near-dup":
+        asyncio.run(bench_near_dup(args.service_ms))
+    elif args.bench == "throughput":
+        asyncio.run(bench_throughput(args.calls, args.size, args.service_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,8 @@ Each model directory gets a model_metadata.json file tracking:
   - model_name, hf_url, quantization, multimodal, gpu_type, n_gpu, backend
   - size_gb, downloaded_at timestamp
   - gguf_pattern (for GGUF models): the subdirectory/file pattern downloaded
+  - architecture: layers, KV heads, head dim, experts and per-tensor bytes, read
+    from the GGUF / safetensors headers by model_inspect.py (no tensors loaded)
 Models with missing or incomplete metadata are re-downloaded automatically.
 
 For GGUF repos with multiple quant files, only the configured gguf_pattern is downloaded.
@@ -21,9 +23,13 @@ from pathlib import Path
 import modal
 
 # Import config — handle running from repo root via `modal run scripts/download_models.py`
+SRC_DIR = Path(__file__).resolve().parent.parent / "src" / "coding_agent_server"
 try:
-    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "coding_agent_server"))
+    sys.path.insert(0, str(SRC_DIR))
+    from capacity import min_gpus, plan_capacity
     from config import (
+        GPU_MEMORY_UTILIZATION,
+        KV_CACHE_DTYPE,
         MODEL_REGISTRY,
         MODELS_TO_DOWNLOAD,
         VLM_MODEL_REGISTRY,
@@ -36,6 +42,7 @@ except ImportError:
     MODELS_TO_DOWNLOAD = ["unsloth/Qwen3.5-397B-A17B-GGUF"]
     MODEL_REGISTRY = {}
     VLM_MODEL_REGISTRY = {}
+    plan_capacity = None
 
 METADATA_FILE = "model_metadata.json"
 
@@ -47,6 +54,7 @@ download_image = (
     modal.Image.debian_slim(python_version="3.12")
     .pip_install("huggingface_hub[hf_xet]")
     .env({"HF_XET_HIGH_PERFORMANCE": "1"})
+    .add_local_file(SRC_DIR / "model_inspect.py", "/root/model_inspect.py")
 )
 
 
@@ -70,7 +78,9 @@ def _read_metadata(model_dir: str) -> dict | None:
         return json.load(f)
 
 
-def _write_metadata(model_dir: str, download_status: str, info: dict, size_gb: float = 0.0):
+def _write_metadata(
+    model_dir: str, download_status: str, info: dict, size_gb: float = 0.0, architecture: dict | None = None
+):
     """Write model_metadata.json. `info` is the model registry entry."""
     import json
     import os
@@ -92,10 +102,23 @@ def _write_metadata(model_dir: str, download_status: str, info: dict, size_gb: f
     }
     if info.get("gguf_pattern"):
         meta["gguf_pattern"] = info["gguf_pattern"]
+    if architecture:
+        meta["architecture"] = architecture
     with open(path, "w") as f:
         json.dump(meta, f, indent=2)
 
 
+def _inspect(model_dir: str, gguf_pattern: str) -> dict | None:
+    """Read the model's architecture from its file headers; None (and a note) if they can't be parsed."""
+    from model_inspect import inspect_model
+
+    try:
+        return inspect_model(model_dir, gguf_pattern)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not read the architecture of {model_dir}: {type(e).__name__}: {e}", flush=True)
+        return None
+
+
 def _dir_size_gb(path: str) -> float:
     import os
 
@@ -113,8 +136,8 @@ def _dir_size_gb(path: str) -> float:
     volumes={VOLUME_MOUNT_PATH: volume},
     timeout=30 * 60,  # 30 minutes
 )
-def download_model(model_name: str, info: dict, force: bool = False):
-    """Download a model to the volume. `info` is the registry entry dict."""
+def download_model(model_name: str, info: dict, force: bool = False) -> dict | None:
+    """Download a model to the volume and return its architecture. `info` is the registry entry dict."""
     from huggingface_hub import snapshot_download
 
     model_dir = f"{VOLUME_MOUNT_PATH}/{model_name}"
@@ -129,7 +152,11 @@ def download_model(model_name: str, info: dict, force: bool = False):
             else:
                 size = _dir_size_gb(model_dir)
                 print(f"Already downloaded: {model_name} ({size:.1f} GB in {model_dir})")
-                return
+                if not meta.get("architecture"):  # downloaded before the architecture was recorded
+                    meta["architecture"] = _inspect(model_dir, gguf_pattern)
+                    _write_metadata(model_dir, "completed", info, size, meta["architecture"])
+                    volume.commit()
+                return meta["architecture"]
 
     # Write metadata as incomplete before starting
     _write_metadata(model_dir, "incomplete", info)
@@ -156,8 +183,25 @@ def download_model(model_name: str, info: dict, force: bool = False):
     size = _dir_size_gb(model_dir)
     print(f"Download complete: {model_name} ({size:.1f} GB in {model_dir})", flush=True)
 
-    _write_metadata(model_dir, "completed", info, size)
+    architecture = _inspect(model_dir, gguf_pattern)
+    _write_metadata(model_dir, "completed", info, size, architecture)
     volume.commit()
+    return architecture
+
+
+def _print_plan(model_name: str, info: dict, architecture: dict) -> None:
+    """Show the KV-cache plan with the measured architecture, and whether n_gpu is enough."""
+    if plan_capacity is None or "gpu_type" not in info:
+        return
+    info = {**info, "arch": {**info.get("arch", {}), **architecture}}
+    backend = "llamacpp" if info.get("backend") == "llamacpp" else "vllm"
+    print(f"  {plan_capacity(model_name, info, backend, KV_CACHE_DTYPE, GPU_MEMORY_UTILIZATION).summary()}")
+    needed = min_gpus(model_name, info, backend, KV_CACHE_DTYPE, GPU_MEMORY_UTILIZATION)
+    if needed != info["n_gpu"]:
+        print(
+            f"  Note: registry n_gpu={info['n_gpu']}, but the measured weights need "
+            f"{needed or 'more than 8'} x {info['gpu_type']}"
+        )
 
 
 @app.local_entrypoint()
@@ -175,4 +219,6 @@ def main(model: str = "", force: bool = False):
         if not info.get("hf_url"):
             info["hf_url"] = f"https://huggingface.co/{m}"
         print(f"  {m}: gguf_pattern={info.get('gguf_pattern', '(none)')}")
-        download_model.remote(m, info=info, force=force)
+        architecture = download_model.remote(m, info=info, force=force)
+        if architecture:
+            _print_plan(m, info, architecture)
@@ -0,0 +1,178 @@
+"""KV-cache capacity planning for the models in config.MODEL_REGISTRY.
+
+From a model's architecture, its weight quantization, the GPU type and count,
+GPU_MEMORY_UTILIZATION and KV_CACHE_DTYPE, plan_capacity() works out:
+
+  - the weight footprint,
+  - the KV-cache bytes per token (full-attention layers only: the Gated
+    DeltaNet layers of the Qwen3-Next / Qwen3.5 hybrids keep a fixed-size
+    recurrent state per sequence instead),
+  - the memory left for the KV cache,
+  - the longest context that fits, and how many sequences of
+    TYPICAL_CONTEXT_TOKENS fit at once.
+
+config.py feeds the result into MAX_MODEL_LEN, LLAMACPP_CTX_SIZE and
+MAX_CONCURRENT_INPUTS for serve_coder. Weight sizes are estimated from the
+parameter count and the bits per weight of the quantization, unless the arch
+carries the real "weights_bytes" read from the files by model_inspect.py.
+
+Print the plan for every registry entry:
+    python src/coding_agent_server/capacity.py
+"""
+
+from dataclasses import dataclass
+
+GIB = 1024**3
+
+# Usable memory per GPU, GiB
+GPU_MEMORY_GIB = {
+    "A10G": 22.0,
+    "L4": 22.0,
+    "L40S": 44.5,
+    "A100-40GB": 39.5,
+    "A100-80GB": 79.1,
+    "H100": 79.1,
+    "H200": 139.8,
+    "B200": 178.4,
+}
+
+# Effective bits per weight, including scales and the layers kept in BF16
+QUANT_BITS_PER_WEIGHT = {"BF16": 16.0, "FP8": 8.2, "NVFP4": 5.0}
+GGUF_BITS_PER_WEIGHT = {  # keyed by the quant name in gguf_pattern
+    "IQ2_XXS": 2.32,
+    "Q3_K_M": 3.85,
+    "Q4_K_M": 4.85,
+    "Q5_K_M": 5.7,
+    "Q6_K": 6.6,
+    "Q8_0": 8.5,
+}
+
+KV_DTYPE_BYTES = {"auto": 2, "bfloat16": 2, "float16": 2, "fp8": 1, "fp8_e4m3": 1, "fp8_e5m2": 1}
+LINEAR_STATE_BYTES = 2  # recurrent state and conv state dtype (bf16)
+CONV_KERNEL = 4  # Gated DeltaNet short-convolution width
+
+RESERVE_GIB_PER_GPU = 3.0  # CUDA context, activations and engine buffers outside the KV cache
+TYPICAL_CONTEXT_TOKENS = 32768  # context of a typical coding-agent request
+MAX_NUM_SEQS = 256  # vLLM's default cap on concurrently scheduled sequences
+
+
+@dataclass(frozen=True)
+class CapacityPlan:
+    model: str
+    gpu: str
+    weights_gib: float
+    kv_bytes_per_token: int
+    state_bytes_per_sequence: int  # fixed recurrent state of the linear-attention layers
+    kv_capacity_gib: float  # memory left for the KV cache across all GPUs
+    max_context: int  # longest sequence the KV cache holds, capped at the model's native context
+    concurrency: int  # sequences of TYPICAL_CONTEXT_TOKENS that fit at once
+
+    @property
+    def fits(self) -> bool:
+        return self.max_context > 0
+
+    def summary(self) -> str:
+        if not self.fits:
+            return (
+                f"{self.model} on {self.gpu}: ~{self.weights_gib:.0f} GiB of weights leave no room "
+                f"for the KV cache"
+            )
+        return (
+            f"{self.model} on {self.gpu}: weights ~{self.weights_gib:.0f} GiB, "
+            f"KV {self.kv_bytes_per_token / 1024:.0f} KiB/token, {self.kv_capacity_gib:.1f} GiB for KV, "
+            f"max context {self.max_context}, ~{self.concurrency} x {TYPICAL_CONTEXT_TOKENS}-token sequences"
+        )
+
+
+def weight_bytes(info: dict) -> float:
+    """Size of the model's weights: as read from its files, else parameter count times bits per weight."""
+    if info["arch"].get("weights_bytes"):
+        return info["arch"]["weights_bytes"]
+    quantization = info.get("quantization", "BF16")
+    if quantization == "GGUF":
+        pattern = info.get("gguf_pattern", "").upper()
+        bits = next((b for name, b in GGUF_BITS_PER_WEIGHT.items() if name in pattern), 4.85)
+    else:
+        bits = QUANT_BITS_PER_WEIGHT.get(quantization, 16.0)
+    return info["arch"]["params_b"] * 1e9 * bits / 8
+
+
+def kv_bytes_per_token(arch: dict, kv_dtype_bytes: int) -> int:
+    """K and V for one token in every full-attention layer."""
+    return 2 * arch["attention_layers"] * arch["kv_heads"] * arch["head_dim"] * kv_dtype_bytes
+
+
+def state_bytes_per_sequence(arch: dict) -> int:
+    """Recurrent plus convolution state of the linear-attention layers, per sequence."""
+    layers = arch.get("linear_layers", 0)
+    if not layers:
+        return 0
+    value_dim = arch["linear_value_heads"] * arch["linear_head_dim"]
+    key_dim = arch["linear_key_heads"] * arch["linear_head_dim"]
+    recurrent = arch["linear_value_heads"] * arch["linear_head_dim"] ** 2
+    conv = (2 * key_dim + value_dim) * (CONV_KERNEL - 1)
+    return layers * (recurrent + conv) * LINEAR_STATE_BYTES
+
+
+def plan_capacity(
+    model: str,
+    info: dict,
+    backend: str,
+    kv_cache_dtype: str,
+    gpu_memory_utilization: float,
+    typical_context: int = TYPICAL_CONTEXT_TOKENS,
+) -> CapacityPlan:
+    """Plan the KV cache of registry entry `info` served by `backend` ("vllm" or "llamacpp").
+
+    llama.cpp gets no --kv-cache-dtype here and keeps its f16 cache, and has
+    no memory-utilization setting; the same fraction is kept as headroom.
+    """
+    arch = info["arch"]
+    n_gpu = info["n_gpu"]
+    dtype_bytes = 2 if backend == "llamacpp" else KV_DTYPE_BYTES.get(kv_cache_dtype, 2)
+    weights = weight_bytes(info)
+    per_token = kv_bytes_per_token(arch, dtype_bytes)
+    per_sequence = state_bytes_per_sequence(arch)
+    budget = n_gpu * GPU_MEMORY_GIB[info["gpu_type"]] * GIB * gpu_memory_utilization
+    kv_capacity = budget - weights - n_gpu * RESERVE_GIB_PER_GPU * GIB
+
+    max_context = 0
+    concurrency = 0
+    if kv_capacity > per_sequence:
+        max_context = min(arch["max_context"], int((kv_capacity - per_sequence) // per_token)) // 1024 * 1024
+    if max_context > 0:
+        concurrency = int(kv_capacity // (per_token * min(typical_context, max_context) + per_sequence))
+        if backend == "llamacpp":  # sequences share the --ctx-size pool of max_context tokens
+            concurrency = min(concurrency, max_context // typical_context)
+        concurrency = max(1, min(MAX_NUM_SEQS, concurrency))
+
+    return CapacityPlan(
+        model=model,
+        gpu=f"{info['gpu_type']}:{n_gpu}",
+        weights_gib=weights / GIB,
+        kv_bytes_per_token=per_token,
+        state_bytes_per_sequence=per_sequence,
+        kv_capacity_gib=max(0.0, kv_capacity / GIB),
+        max_context=max_context,
+        concurrency=concurrency,
+    )
+
+
+def min_gpus(
+    model: str, info: dict, backend: str, kv_cache_dtype: str, gpu_memory_utilization: float, limit: int = 8
+) -> int | None:
+    """Fewest GPUs of info's gpu_type that hold the weights and one TYPICAL_CONTEXT_TOKENS sequence."""
+    for n_gpu in range(1, limit + 1):
+        plan = plan_capacity(model, {**info, "n_gpu": n_gpu}, backend, kv_cache_dtype, gpu_memory_utilization)
+        if plan.fits and plan.max_context >= min(TYPICAL_CONTEXT_TOKENS, info["arch"]["max_context"]):
+            return n_gpu
+    return None
+
+
+if __name__ == "__main__":
+    from config import GPU_MEMORY_UTILIZATION, KV_CACHE_DTYPE, MODEL_REGISTRY, VLM_MODEL_REGISTRY
+
+    for registry in (MODEL_REGISTRY, VLM_MODEL_REGISTRY):
+        for name, entry in registry.items():
+            backend = "llamacpp" if entry["backend"] == "llamacpp" else "vllm"
+            print(plan_capacity(name, entry, backend, KV_CACHE_DTYPE, GPU_MEMORY_UTILIZATION).summary())
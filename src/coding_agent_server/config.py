@@ -16,6 +16,12 @@ Multimodal Models:
 """
 
 import os
+import warnings
+
+try:
+    from .capacity import plan_capacity
+except ImportError:
+    from capacity import plan_capacity  # type: ignore[no-redef]
 
 # --- Coder model configuration ---
 CODER_MODEL_NAME = os.environ.get("CODER_MODEL_NAME", "unsloth/Qwen3.5-397B-A17B-GGUF")
@@ -29,8 +35,31 @@ INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "llamacpp")
 VOLUME_NAME = "coding-agent-models"
 VOLUME_MOUNT_PATH = "/models"
 
+# --- Model architectures (from the models' config.json), for capacity planning ---
+# attention_layers hold a KV cache; the Gated DeltaNet linear_layers of the hybrids
+# keep a fixed recurrent state per sequence instead
+_QWEN35_397B_A17B = {
+    "params_b": 397, "layers": 60, "attention_layers": 15, "kv_heads": 2, "head_dim": 256,
+    "linear_layers": 45, "linear_key_heads": 16, "linear_value_heads": 64, "linear_head_dim": 128,
+    "experts": 512, "max_context": 262144,
+}
+_QWEN3_CODER_NEXT = {
+    "params_b": 80, "layers": 48, "attention_layers": 12, "kv_heads": 2, "head_dim": 256,
+    "linear_layers": 36, "linear_key_heads": 16, "linear_value_heads": 32, "linear_head_dim": 128,
+    "experts": 512, "max_context": 262144,
+}
+_QWEN35_35B_A3B = {
+    "params_b": 35, "layers": 40, "attention_layers": 10, "kv_heads": 2, "head_dim": 256,
+    "linear_layers": 30, "linear_key_heads": 16, "linear_value_heads": 32, "linear_head_dim": 128,
+    "experts": 256, "max_context": 262144,
+}
+_QWEN3_VL_32B = {
+    "params_b": 33, "layers": 64, "attention_layers": 64, "kv_heads": 8, "head_dim": 128,
+    "experts": 0, "max_context": 262144,
+}
+
 # --- Model registry ---
-# Each entry: {gpu_type, n_gpu, multimodal, quantization, hf_url, backend}
+# Each entry: {gpu_type, n_gpu, multimodal, quantization, hf_url, backend, arch}
 # backend: "any" (works with both), "vllm" (vllm only), "llamacpp" (llamacpp only)
 # GGUF file selection for multi-quant repos (set via env var)
 # Only used when model repo contains multiple GGUF files
@@ -42,12 +71,13 @@ MODEL_REGISTRY = {
     # --- llama.cpp (GGUF) models ---
     "unsloth/Qwen3.5-397B-A17B-GGUF": {
         "gpu_type": "A100-80GB",
-        "n_gpu": 3,  # 115GB weights + 96K ctx KV cache needs ~125GB headroom
+        "n_gpu": 3,
         "multimodal": True,  # Qwen3.5 has built-in vision — no VLM MCP needed
         "quantization": "GGUF",
         "backend": "llamacpp",
         "gguf_pattern": GGUF_PATTERN,  # UD-IQ2_XXS=115GB(3xA100-80GB)
         "hf_url": "https://huggingface.co/unsloth/Qwen3.5-397B-A17B-GGUF",
+        "arch": _QWEN35_397B_A17B,
     },
     "unsloth/Qwen3-Coder-Next-GGUF": {
         "gpu_type": "A100-80GB",
@@ -57,6 +87,7 @@ MODEL_REGISTRY = {
         "backend": "llamacpp",
         "gguf_pattern": GGUF_PATTERN,  # Q4_K_M=48.5GB, Q3_K_M=38.3GB
         "hf_url": "https://huggingface.co/unsloth/Qwen3-Coder-Next-GGUF",
+        "arch": _QWEN3_CODER_NEXT,
     },
     # --- vLLM models ---
     "GadflyII/Qwen3-Coder-Next-NVFP4": {
@@ -66,6 +97,7 @@ MODEL_REGISTRY = {
         "quantization": "NVFP4",
         "backend": "vllm",
         "hf_url": "https://huggingface.co/GadflyII/Qwen3-Coder-Next-NVFP4",
+        "arch": _QWEN3_CODER_NEXT,
     },
     "unsloth/Qwen3-Coder-Next-FP8-Dynamic": {
         "gpu_type": "A100-80GB",
@@ -74,6 +106,7 @@ MODEL_REGISTRY = {
         "quantization": "FP8",
         "backend": "vllm",
         "hf_url": "https://huggingface.co/unsloth/Qwen3-Coder-Next-FP8-Dynamic",
+        "arch": _QWEN3_CODER_NEXT,
     },
     "Sehyo/Qwen3.5-35B-A3B-NVFP4": {
         "gpu_type": "A100-40GB",
@@ -82,6 +115,7 @@ MODEL_REGISTRY = {
         "quantization": "NVFP4",
         "backend": "vllm",
         "hf_url": "https://huggingface.co/Sehyo/Qwen3.5-35B-A3B-NVFP4",
+        "arch": _QWEN35_35B_A3B,
     },
     "Qwen/Qwen3.5-35B-A3B-FP8": {
         "gpu_type": "A100-40GB",
@@ -90,6 +124,7 @@ MODEL_REGISTRY = {
         "quantization": "FP8",
         "backend": "vllm",
         "hf_url": "https://huggingface.co/Qwen/Qwen3.5-35B-A3B-FP8",
+        "arch": _QWEN35_35B_A3B,
     },
     "nvidia/Qwen3.5-397B-A17B-NVFP4": {
         "gpu_type": "A100-80GB",
@@ -98,6 +133,7 @@ MODEL_REGISTRY = {
         "quantization": "NVFP4",
         "backend": "vllm",
         "hf_url": "https://huggingface.co/nvidia/Qwen3.5-397B-A17B-NVFP4",
+        "arch": _QWEN35_397B_A17B,
     },
 }
 
@@ -110,6 +146,7 @@ VLM_MODEL_REGISTRY = {
         "quantization": "FP8",
         "backend": "vllm",
         "hf_url": "https://huggingface.co/Qwen/Qwen3-VL-32B-Thinking-FP8",
+        "arch": _QWEN3_VL_32B,
     },
 }
 
@@ -133,18 +170,47 @@ MODEL_NAME = CODER_MODEL_NAME
 # When True, the VLM MCP server is disabled
 IS_MULTIMODAL_MODEL = _model_info.get("multimodal", False)
 
-# Scaling
-SCALEDOWN_WINDOW = 300  # 5 minutes idle before scale-to-zero
-MAX_CONCURRENT_INPUTS = 128 if INFERENCE_BACKEND == "vllm" else 8
-
 # vLLM engine settings (only used when INFERENCE_BACKEND == "vllm")
-MAX_MODEL_LEN = 131072  # 128K — ~60 GiB free for KV cache on A100-80GB
 GPU_MEMORY_UTILIZATION = 0.90
 KV_CACHE_DTYPE = "fp8"
 TOOL_CALL_PARSER = "qwen3_coder"
+# CUDA graphs and torch.compile are on; their artifacts are cached on the volume per
+# (vLLM version, model, TP size, GPU type) so only the first cold start compiles.
+# VLLM_ENFORCE_EAGER=1 is the fallback if graph capture misbehaves (slower decode).
+VLLM_ENFORCE_EAGER = os.environ.get("VLLM_ENFORCE_EAGER", "0") == "1"
+COMPILE_CACHE_DIR = f"{VOLUME_MOUNT_PATH}/.compile-cache"
+
+# Context length and concurrency come from the KV-cache capacity plan (capacity.py);
+# the fallbacks apply to models without an "arch" entry or whose weights don't fit
+CAPACITY_PLAN = (
+    plan_capacity(CODER_MODEL_NAME, _model_info, INFERENCE_BACKEND, KV_CACHE_DTYPE, GPU_MEMORY_UTILIZATION)
+    if "arch" in _model_info
+    else None
+)
+if CAPACITY_PLAN is not None and not CAPACITY_PLAN.fits:
+    warnings.warn(CAPACITY_PLAN.summary() + "; falling back to the default context length and concurrency")
+    CAPACITY_PLAN = None
+
+# Scaling
+SCALEDOWN_WINDOW = 300  # 5 minutes idle before scale-to-zero
+_default_concurrency = 128 if INFERENCE_BACKEND == "vllm" else 8
+MAX_CONCURRENT_INPUTS = int(
+    os.environ.get(
+        "MAX_CONCURRENT_INPUTS",
+        min(_default_concurrency, CAPACITY_PLAN.concurrency) if CAPACITY_PLAN else _default_concurrency,
+    )
+)
+if CAPACITY_PLAN is not None and MAX_CONCURRENT_INPUTS > CAPACITY_PLAN.concurrency:
+    warnings.warn(
+        f"MAX_CONCURRENT_INPUTS={MAX_CONCURRENT_INPUTS} exceeds the ~{CAPACITY_PLAN.concurrency} sequences "
+        f"the KV cache holds ({CAPACITY_PLAN.summary()}); the extra requests will queue or be preempted"
+    )
+
+# vLLM --max-model-len
+MAX_MODEL_LEN = CAPACITY_PLAN.max_context if CAPACITY_PLAN else 131072
 
 # llama.cpp settings (only used when INFERENCE_BACKEND == "llamacpp")
-LLAMACPP_CTX_SIZE = 98304  # 96K — fits in 3x A100-80GB with IQ2_XXS weights
+LLAMACPP_CTX_SIZE = CAPACITY_PLAN.max_context if CAPACITY_PLAN else 98304
 LLAMACPP_N_GPU_LAYERS = 999  # offload all layers to GPU
 LLAMACPP_FLASH_ATTN = True  # use flash attention if supported
 
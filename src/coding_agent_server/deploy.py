@@ -26,6 +26,7 @@ try:
     from .config import (
         APP_NAME,
         CODER_MODEL_NAME,
+        COMPILE_CACHE_DIR,
         ENABLE_VLM_MCP,
         GGUF_PATTERN,
         GPU_MEMORY_UTILIZATION,
@@ -39,6 +40,7 @@ try:
         MAX_CONCURRENT_INPUTS,
         MAX_MODEL_LEN,
         MODEL_DIR,
+        MODEL_REGISTRY,
         MODEL_NAME,
         N_GPU,
         SCALEDOWN_WINDOW,
@@ -51,14 +53,18 @@ try:
         VLM_MODEL_DIR,
         VLM_MODEL_NAME,
         VLM_N_GPU,
+        VLLM_ENFORCE_EAGER,
         VOLUME_MOUNT_PATH,
         VOLUME_NAME,
     )
+    from .capacity import CapacityPlan, plan_capacity
+    from .supervisor import LLAMACPP_MILESTONES, VLLM_MILESTONES, EngineSupervisor, StartupTimeline
 except ImportError:
     sys.path.insert(0, str(Path(__file__).parent))
     from config import (  # type: ignore[no-redef]
         APP_NAME,
         CODER_MODEL_NAME,
+        COMPILE_CACHE_DIR,
         ENABLE_VLM_MCP,
         GGUF_PATTERN,
         GPU_MEMORY_UTILIZATION,
@@ -72,6 +78,7 @@ except ImportError:
         MAX_CONCURRENT_INPUTS,
         MAX_MODEL_LEN,
         MODEL_DIR,
+        MODEL_REGISTRY,
         MODEL_NAME,
         N_GPU,
         SCALEDOWN_WINDOW,
@@ -84,15 +91,29 @@ except ImportError:
         VLM_MODEL_DIR,
         VLM_MODEL_NAME,
         VLM_N_GPU,
+        VLLM_ENFORCE_EAGER,
         VOLUME_MOUNT_PATH,
         VOLUME_NAME,
     )
+    from capacity import CapacityPlan, plan_capacity  # type: ignore[no-redef]
+    from supervisor import (  # type: ignore[no-redef]
+        LLAMACPP_MILESTONES,
+        VLLM_MILESTONES,
+        EngineSupervisor,
+        StartupTimeline,
+    )
 
 # --- Images ---
 
 MINUTES = 60  # seconds
+ENGINE_STARTUP_TIMEOUT = 10 * MINUTES  # matches the web_server startup_timeout
+TIMELINE_DIR = f"{VOLUME_MOUNT_PATH}/.timelines"  # cold-start timelines, read by scripts/bench_cold_start.py
+DECODE_BENCH_TOKENS = 512  # tokens generated per decode-speed sample
+DECODE_BENCH_RUNS = 3
 
 config_path = str(Path(__file__).parent / "config.py")
+capacity_path = str(Path(__file__).parent / "capacity.py")
+supervisor_path = str(Path(__file__).parent / "supervisor.py")
 
 vllm_image = (
     modal.Image.from_registry(
@@ -101,6 +122,8 @@ vllm_image = (
     .entrypoint([])
     .uv_pip_install("vllm>=0.15.0")
     .add_local_file(config_path, "/root/config.py", copy=True)
+    .add_local_file(capacity_path, "/root/capacity.py", copy=True)
+    .add_local_file(supervisor_path, "/root/supervisor.py", copy=True)
 )
 
 llamacpp_image = (
@@ -118,6 +141,8 @@ llamacpp_image = (
         "rm /usr/lib/x86_64-linux-gnu/libcuda.so.1",  # remove stub; real driver provides this at runtime
     )
     .add_local_file(config_path, "/root/config.py", copy=True)
+    .add_local_file(capacity_path, "/root/capacity.py", copy=True)
+    .add_local_file(supervisor_path, "/root/supervisor.py", copy=True)
 )
 
 # Pick image based on backend
@@ -153,6 +178,35 @@ def _check_model_status(model_dir: str, model_name: str) -> str | None:
     return None
 
 
+def _measured_plan(model_dir: str) -> CapacityPlan | None:
+    """Re-plan the KV cache with the architecture read from the model files at download time.
+
+    config.py plans from the registry's estimates, because it also runs
+    locally at deploy time. model_metadata.json holds the real layer counts
+    and weight bytes. Returns None if they are missing or the model does not
+    fit, which keeps config's values.
+    """
+    import json
+    import os
+
+    with open(os.path.join(model_dir, "model_metadata.json")) as f:
+        measured = json.load(f).get("architecture")
+    if not measured:
+        return None
+    info = MODEL_REGISTRY.get(CODER_MODEL_NAME, {})
+    info = {**info, "gpu_type": GPU_TYPE, "n_gpu": N_GPU, "arch": {**info.get("arch", {}), **measured}}
+    plan = plan_capacity(CODER_MODEL_NAME, info, INFERENCE_BACKEND, KV_CACHE_DTYPE, GPU_MEMORY_UTILIZATION)
+    print(f"Capacity plan from model files: {plan.summary()}")
+    if not plan.fits:
+        return None
+    if MAX_CONCURRENT_INPUTS > plan.concurrency:
+        print(
+            f"Warning: MAX_CONCURRENT_INPUTS={MAX_CONCURRENT_INPUTS} exceeds the "
+            f"~{plan.concurrency} sequences the KV cache holds"
+        )
+    return plan
+
+
 def _find_gguf_file(model_dir: str, gguf_pattern: str = "") -> str:
     """Find the primary GGUF file in a model directory.
 
@@ -181,6 +235,91 @@ def _find_gguf_file(model_dir: str, gguf_pattern: str = "") -> str:
     return gguf_files[0]
 
 
+def _compile_cache_env(model_name: str, n_gpu: int, gpu_type: str) -> dict[str, str]:
+    """Point vLLM's torch.compile, Inductor and Triton caches at the volume.
+
+    Each (vLLM version, model, TP size, GPU type) gets its own directory:
+    compiled kernels are only valid for the exact combination that produced
+    them. The first cold start (or prewarm_*) compiles and writes there, and
+    later cold starts load the artifacts instead of compiling.
+    """
+    from importlib.metadata import version
+
+    key = f"vllm-{version('vllm')}/{model_name.replace('/', '--')}/tp{n_gpu}-{gpu_type}"
+    root = f"{COMPILE_CACHE_DIR}/{key}"
+    return {
+        "VLLM_CACHE_ROOT": root,
+        "TORCHINDUCTOR_CACHE_DIR": f"{root}/inductor",
+        "TRITON_CACHE_DIR": f"{root}/triton",
+    }
+
+
+def _coder_vllm_cmd(max_model_len: int, eager: bool = VLLM_ENFORCE_EAGER) -> list[str]:
+    cmd = [
+        "vllm",
+        "serve",
+        MODEL_DIR,
+        "--host", "0.0.0.0",
+        "--port", str(SERVER_PORT),
+        "--served-model-name", MODEL_NAME,
+        "--tensor-parallel-size", str(N_GPU),
+        "--max-model-len", str(max_model_len),
+        "--gpu-memory-utilization", str(GPU_MEMORY_UTILIZATION),
+        "--kv-cache-dtype", KV_CACHE_DTYPE,
+        "--enable-auto-tool-choice",
+        "--tool-call-parser", TOOL_CALL_PARSER,
+        "--trust-remote-code",
+        "--disable-log-requests",
+    ]
+    return [*cmd, "--enforce-eager"] if eager else cmd
+
+
+def _vlm_cmd(eager: bool = VLLM_ENFORCE_EAGER) -> list[str]:
+    cmd = [
+        "vllm",
+        "serve",
+        VLM_MODEL_DIR,
+        "--host", "0.0.0.0",
+        "--port", str(SERVER_PORT),
+        "--served-model-name", VLM_MODEL_NAME,
+        "--tensor-parallel-size", str(VLM_N_GPU),
+        "--max-model-len", str(VLM_MAX_MODEL_LEN),
+        "--gpu-memory-utilization", str(VLM_GPU_MEMORY_UTILIZATION),
+        "--kv-cache-dtype", KV_CACHE_DTYPE,
+        "--limit-mm-per-prompt", '{"image":5}',
+        "--trust-remote-code",
+        "--disable-log-requests",
+    ]
+    return [*cmd, "--enforce-eager"] if eager else cmd
+
+
+def _supervise(
+    name: str, cmd: list[str], timeline: StartupTimeline, env: dict[str, str] | None = None
+) -> EngineSupervisor:
+    """Start the engine under a supervisor and block until its /health answers.
+
+    Returning only once the engine is healthy means Modal routes no request to
+    a half-loaded server, and a crash loop during loading fails the container
+    with the engine's last log lines instead of a startup timeout. After
+    that, the supervisor keeps restarting the engine if it dies.
+
+    The cold-start timeline is written to the volume once the engine is
+    ready; failing to write it does not fail the container. The commit also
+    persists any compile artifacts the engine wrote to the volume cache.
+    """
+    supervisor = EngineSupervisor(
+        name, cmd, f"http://127.0.0.1:{SERVER_PORT}/health", env=env, on_event=timeline.observe
+    )
+    supervisor.start()
+    supervisor.wait_ready(ENGINE_STARTUP_TIMEOUT)
+    try:
+        timeline.write(TIMELINE_DIR)
+        volume.commit()
+    except Exception as e:
+        print(f"Could not save the {name} cold-start timeline: {e}")
+    return supervisor
+
+
 @app.function(
     image=coder_image,
     gpu=f"{GPU_TYPE}:{N_GPU}",
@@ -192,11 +331,18 @@ def _find_gguf_file(model_dir: str, gguf_pattern: str = "") -> str:
 @modal.concurrent(max_inputs=MAX_CONCURRENT_INPUTS)
 @modal.web_server(port=SERVER_PORT, startup_timeout=10 * MINUTES, requires_proxy_auth=True)
 def serve_coder():
-    import subprocess
-
+    timeline = StartupTimeline(
+        "coder",
+        LLAMACPP_MILESTONES if INFERENCE_BACKEND == "llamacpp" else VLLM_MILESTONES,
+        model=CODER_MODEL_NAME,
+        backend=INFERENCE_BACKEND,
+        gpu=f"{GPU_TYPE}:{N_GPU}",
+    )
     status = _check_model_status(MODEL_DIR, CODER_MODEL_NAME)
+    timeline.mark("volume_ready")
     if status:
         raise RuntimeError(status)
+    plan = _measured_plan(MODEL_DIR)
 
     if INFERENCE_BACKEND == "llamacpp":
         gguf_path = _find_gguf_file(MODEL_DIR, GGUF_PATTERN)
@@ -206,34 +352,19 @@ def serve_coder():
             "--host", "0.0.0.0",
             "--port", str(SERVER_PORT),
             "-ngl", str(LLAMACPP_N_GPU_LAYERS),
-            "--ctx-size", str(LLAMACPP_CTX_SIZE),
+            "--ctx-size", str(plan.max_context if plan else LLAMACPP_CTX_SIZE),
             "--alias", MODEL_NAME,
         ]
         if LLAMACPP_FLASH_ATTN:
             cmd.extend(["--flash-attn", "on"])
         if N_GPU > 1:
             cmd.extend(["--split-mode", "layer"])
+        env = None
     else:
-        cmd = [
-            "vllm",
-            "serve",
-            MODEL_DIR,
-            "--host", "0.0.0.0",
-            "--port", str(SERVER_PORT),
-            "--served-model-name", MODEL_NAME,
-            "--tensor-parallel-size", str(N_GPU),
-            "--max-model-len", str(MAX_MODEL_LEN),
-            "--gpu-memory-utilization", str(GPU_MEMORY_UTILIZATION),
-            "--kv-cache-dtype", KV_CACHE_DTYPE,
-            "--enable-auto-tool-choice",
-            "--tool-call-parser", TOOL_CALL_PARSER,
-            "--trust-remote-code",
-            "--enforce-eager",
-            "--disable-log-requests",
-        ]
+        cmd = _coder_vllm_cmd(plan.max_context if plan else MAX_MODEL_LEN)
+        env = _compile_cache_env(CODER_MODEL_NAME, N_GPU, GPU_TYPE)
 
-    print(f"Starting {INFERENCE_BACKEND}:", *cmd)
-    subprocess.Popen(cmd)
+    _supervise("coder", cmd, timeline, env)
 
 
 # VLM endpoint only if VLM MCP is enabled (not using multimodal model)
@@ -250,31 +381,115 @@ if ENABLE_VLM_MCP:
     @modal.concurrent(max_inputs=VLM_MAX_CONCURRENT_INPUTS)
     @modal.web_server(port=SERVER_PORT, startup_timeout=10 * MINUTES, requires_proxy_auth=True)
     def serve_vlm():
-        import subprocess
-
+        timeline = StartupTimeline(
+            "vlm", VLLM_MILESTONES, model=VLM_MODEL_NAME, backend="vllm", gpu=f"{VLM_GPU_TYPE}:{VLM_N_GPU}"
+        )
         status = _check_model_status(VLM_MODEL_DIR, VLM_MODEL_NAME)
+        timeline.mark("volume_ready")
         if status:
             raise RuntimeError(status)
 
-        cmd = [
-            "vllm",
-            "serve",
-            VLM_MODEL_DIR,
-            "--host", "0.0.0.0",
-            "--port", str(SERVER_PORT),
-            "--served-model-name", VLM_MODEL_NAME,
-            "--tensor-parallel-size", str(VLM_N_GPU),
-            "--max-model-len", str(VLM_MAX_MODEL_LEN),
-            "--gpu-memory-utilization", str(VLM_GPU_MEMORY_UTILIZATION),
-            "--kv-cache-dtype", KV_CACHE_DTYPE,
-            "--limit-mm-per-prompt", '{"image":5}',
-            "--trust-remote-code",
-            "--enforce-eager",
-            "--disable-log-requests",
-        ]
+        _supervise("vlm", _vlm_cmd(), timeline, _compile_cache_env(VLM_MODEL_NAME, VLM_N_GPU, VLM_GPU_TYPE))
+
+
+# --- Compile-cache pre-warm and decode benchmark (`./run.sh prewarm coder|vlm [--bench]`) ---
+
+
+def _decode_tokens_per_second(model: str) -> float:
+    """Median single-stream decode speed of the local engine, first token excluded."""
+    import statistics
+    import time
+    import urllib.request
+
+    body = json.dumps(
+        {
+            "model": model,
+            "messages": [{"role": "user", "content": "Write a long story about a lighthouse keeper."}],
+            "max_tokens": DECODE_BENCH_TOKENS,
+            "ignore_eos": True,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+    ).encode()
+    rates = []
+    for _ in range(DECODE_BENCH_RUNS):
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{SERVER_PORT}/v1/chat/completions",
+            data=body,
+            headers={"Content-Type": "application/json"},
+        )
+        first_token, tokens = None, 0
+        with urllib.request.urlopen(request, timeout=10 * MINUTES) as resp:
+            for raw in resp:
+                line = raw.decode().strip()
+                if not line.startswith("data: ") or line == "data: [DONE]":
+                    continue
+                chunk = json.loads(line[len("data: "):])
+                if chunk.get("usage"):
+                    tokens = chunk["usage"]["completion_tokens"]
+                delta = chunk["choices"][0]["delta"] if chunk.get("choices") else {}
+                if first_token is None and any(delta.get(k) for k in ("content", "reasoning_content", "reasoning")):
+                    first_token = time.monotonic()
+        rates.append((tokens - 1) / (time.monotonic() - first_token))
+    return round(statistics.median(rates), 1)
+
+
+def _prewarm(name: str, cmd: list[str], env: dict[str, str], model: str, bench: bool) -> dict:
+    """Start the engine with CUDA graphs so its compile artifacts land in the volume cache.
+
+    With bench, also measure decode tokens/s with graphs and then in eager
+    mode (the VLLM_ENFORCE_EAGER fallback), with the load time of each.
+    """
+    results = {}
+    modes = {"graphs": cmd, "eager": [*cmd, "--enforce-eager"]} if bench else {"graphs": cmd}
+    for mode, mode_cmd in modes.items():
+        supervisor = EngineSupervisor(name, mode_cmd, f"http://127.0.0.1:{SERVER_PORT}/health", env=env)
+        supervisor.start()
+        try:
+            result = {"load_seconds": round(supervisor.wait_ready(ENGINE_STARTUP_TIMEOUT), 1)}
+            if bench:
+                result["decode_tokens_per_second"] = _decode_tokens_per_second(model)
+        finally:
+            supervisor.stop()
+        if mode == "graphs":
+            volume.commit()
+        results[mode] = result
+        print(f"{name} [{mode}]: {json.dumps(result)}")
+    print(f"Compile cache: {env['VLLM_CACHE_ROOT']}")
+    return results
+
+
+if INFERENCE_BACKEND == "vllm":
+
+    @app.function(
+        image=vllm_image,
+        gpu=f"{GPU_TYPE}:{N_GPU}",
+        timeout=60 * MINUTES,
+        volumes={VOLUME_MOUNT_PATH: volume},
+    )
+    def prewarm_coder(bench: bool = False) -> dict:
+        status = _check_model_status(MODEL_DIR, CODER_MODEL_NAME)
+        if status:
+            raise RuntimeError(status)
+        plan = _measured_plan(MODEL_DIR)
+        cmd = _coder_vllm_cmd(plan.max_context if plan else MAX_MODEL_LEN, eager=False)
+        return _prewarm("coder", cmd, _compile_cache_env(CODER_MODEL_NAME, N_GPU, GPU_TYPE), MODEL_NAME, bench)
 
-        print("Starting vLLM (VLM):", *cmd)
-        subprocess.Popen(cmd)
+
+if ENABLE_VLM_MCP:
+
+    @app.function(
+        image=vllm_image,
+        gpu=f"{VLM_GPU_TYPE}:{VLM_N_GPU}",
+        timeout=60 * MINUTES,
+        volumes={VOLUME_MOUNT_PATH: volume},
+    )
+    def prewarm_vlm(bench: bool = False) -> dict:
+        status = _check_model_status(VLM_MODEL_DIR, VLM_MODEL_NAME)
+        if status:
+            raise RuntimeError(status)
+        env = _compile_cache_env(VLM_MODEL_NAME, VLM_N_GPU, VLM_GPU_TYPE)
+        return _prewarm("vlm", _vlm_cmd(eager=False), env, VLM_MODEL_NAME, bench)
 
 
 # --- Local entrypoint (smoke test via `modal run`) ---
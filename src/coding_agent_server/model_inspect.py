@@ -0,0 +1,238 @@
+"""Read a model's architecture from the files on the volume, without loading tensors.
+
+GGUF files are memory-mapped and only their header is parsed: the key/value
+metadata and the tensor table (name, shape, type, data offset). For
+safetensors checkpoints, config.json and the JSON header at the start of each
+*.safetensors file are read. Both produce the same architecture dict, in the
+format of the "arch" entries of config.MODEL_REGISTRY that capacity.py plans
+with, plus the real weight size and the byte size of every tensor.
+
+scripts/download_models.py stores the result under "architecture" in
+model_metadata.json, and serve_coder plans its context length from it.
+
+Stdlib only, so it runs in the download container and in both engine images.
+"""
+
+import glob
+import json
+import mmap
+import os
+import re
+import struct
+
+GGUF_MAGIC = b"GGUF"
+GGUF_DEFAULT_ALIGNMENT = 32
+MAX_ARRAY_ITEMS = 4096  # longer metadata arrays (tokenizer vocab, merges) are skipped, not stored
+
+# GGUF metadata value types -> struct format; 8 is a string and 9 an array
+_GGUF_SCALARS = {0: "B", 1: "b", 2: "H", 3: "h", 4: "I", 5: "i", 6: "f", 7: "?", 10: "Q", 11: "q", 12: "d"}
+_GGUF_STRING = 8
+_GGUF_ARRAY = 9
+
+_GGUF_LAYER = re.compile(r"^blk\.(\d+)\.")
+
+
+class _Reader:
+    """Little-endian reads from a buffer at a moving position."""
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.pos = 0
+
+    def scalar(self, fmt: str):
+        (value,) = struct.unpack_from("<" + fmt, self.buf, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return value
+
+    def string(self) -> str:
+        n = self.scalar("Q")
+        value = self.buf[self.pos : self.pos + n].decode("utf-8", "replace")
+        self.pos += n
+        return value
+
+    def value(self, kind: int):
+        """Read one metadata value; arrays longer than MAX_ARRAY_ITEMS are skipped and read as None."""
+        if kind in _GGUF_SCALARS:
+            return self.scalar(_GGUF_SCALARS[kind])
+        if kind == _GGUF_STRING:
+            return self.string()
+        if kind != _GGUF_ARRAY:
+            raise ValueError(f"unknown GGUF value type {kind}")
+        item_kind, count = self.scalar("I"), self.scalar("Q")
+        if item_kind in _GGUF_SCALARS and count > MAX_ARRAY_ITEMS:
+            self.pos += count * struct.calcsize(_GGUF_SCALARS[item_kind])
+            return None
+        items = [self.value(item_kind) for _ in range(count)]
+        return items if count <= MAX_ARRAY_ITEMS else None
+
+
+def read_gguf(path: str) -> dict:
+    """Parse a GGUF file's header: {"metadata": {key: value}, "tensors": {name: {shape, type, bytes}}}.
+
+    A tensor's bytes run from its data offset to the next tensor's (or the end
+    of the file), so they include the few bytes of alignment padding.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        reader = _Reader(buf)
+        if buf[:4] != GGUF_MAGIC:
+            raise ValueError(f"{path} is not a GGUF file")
+        reader.pos = 4
+        version = reader.scalar("I")
+        if version < 2:
+            raise ValueError(f"{path}: GGUF version {version} is not supported")
+        tensor_count, kv_count = reader.scalar("Q"), reader.scalar("Q")
+
+        metadata = {}
+        for _ in range(kv_count):
+            key = reader.string()
+            value = reader.value(reader.scalar("I"))
+            if value is not None:
+                metadata[key] = value
+
+        tensors = {}
+        for _ in range(tensor_count):
+            name = reader.string()
+            shape = [reader.scalar("Q") for _ in range(reader.scalar("I"))]
+            tensors[name] = {"shape": shape, "type": reader.scalar("I"), "offset": reader.scalar("Q")}
+
+        alignment = metadata.get("general.alignment", GGUF_DEFAULT_ALIGNMENT)
+        data_size = len(buf) - (reader.pos + alignment - 1) // alignment * alignment
+
+    ordered = sorted(tensors.values(), key=lambda t: t["offset"])
+    for tensor, following in zip(ordered, [*ordered[1:], None]):
+        end = following["offset"] if following else data_size
+        tensor["bytes"] = end - tensor.pop("offset")
+    return {"metadata": metadata, "tensors": tensors}
+
+
+def read_safetensors_header(path: str) -> dict:
+    """The tensors of a .safetensors file: {name: {shape, dtype, bytes}}, from its JSON header."""
+    with open(path, "rb") as f:
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+    return {
+        name: {"shape": t["shape"], "dtype": t["dtype"], "bytes": t["data_offsets"][1] - t["data_offsets"][0]}
+        for name, t in header.items()
+        if name != "__metadata__"
+    }
+
+
+def _layer_ids(tensors: dict, marker: str) -> set[int]:
+    ids = set()
+    for name in tensors:
+        match = _GGUF_LAYER.match(name)
+        if match and marker in name:
+            ids.add(int(match.group(1)))
+    return ids
+
+
+def _num_params(tensors: dict) -> int:
+    total = 0
+    for tensor in tensors.values():
+        n = 1
+        for dim in tensor["shape"]:
+            n *= dim
+        total += n
+    return total
+
+
+def _architecture(tensors: dict, **fields) -> dict:
+    return {
+        "params_b": round(_num_params(tensors) / 1e9, 2),
+        **fields,
+        "weights_bytes": sum(t["bytes"] for t in tensors.values()),
+        "tensor_bytes": {name: t["bytes"] for name, t in tensors.items()},
+    }
+
+
+def gguf_architecture(paths: list[str]) -> dict:
+    """Architecture of a GGUF model, sharded over `paths` (metadata from the first shard)."""
+    parsed = [read_gguf(path) for path in sorted(paths)]
+    meta = parsed[0]["metadata"]
+    tensors = {name: t for p in parsed for name, t in p["tensors"].items()}
+    arch = meta.get("general.architecture", "")
+
+    def key(name: str, default=0):
+        return meta.get(f"{arch}.{name}", default)
+
+    layers = key("block_count")
+    kv_heads = key("attention.head_count_kv")
+    if isinstance(kv_heads, list):  # per layer; 0 on layers without attention
+        kv_heads = max(kv_heads, default=0)
+    heads = key("attention.head_count")
+    if isinstance(heads, list):
+        heads = max(heads, default=0)
+    head_dim = key("attention.key_length") or (key("embedding_length") // heads if heads else 0)
+
+    attention = _layer_ids(tensors, ".attn_k.")
+    linear = _layer_ids(tensors, ".ssm_")
+    if not attention:
+        interval = key("full_attention_interval")
+        attention_layers = layers // interval if interval else layers
+    else:
+        attention_layers = len(attention)
+    linear_layers = len(linear) or (layers - attention_layers if key("ssm.state_size") else 0)
+
+    return _architecture(
+        tensors,
+        source="gguf",
+        model_type=arch,
+        layers=layers,
+        attention_layers=attention_layers,
+        kv_heads=kv_heads,
+        head_dim=head_dim,
+        linear_layers=linear_layers,
+        linear_key_heads=key("ssm.group_count"),
+        linear_value_heads=key("ssm.time_step_rank"),
+        linear_head_dim=key("ssm.state_size"),
+        experts=key("expert_count"),
+        experts_used=key("expert_used_count"),
+        max_context=key("context_length"),
+    )
+
+
+def hf_architecture(model_dir: str) -> dict:
+    """Architecture of a Hugging Face checkpoint, from config.json and the safetensors headers."""
+    with open(os.path.join(model_dir, "config.json")) as f:
+        config = json.load(f)
+    text = config.get("text_config", config)  # multimodal configs nest the language model
+    tensors = {}
+    for path in sorted(glob.glob(os.path.join(model_dir, "*.safetensors"))):
+        tensors.update(read_safetensors_header(path))
+
+    layers = text["num_hidden_layers"]
+    heads = text["num_attention_heads"]
+    layer_types = text.get("layer_types")
+    if layer_types:
+        attention_layers = sum(t == "full_attention" for t in layer_types)
+    elif text.get("full_attention_interval"):
+        attention_layers = layers // text["full_attention_interval"]
+    else:
+        attention_layers = layers
+    linear_layers = layers - attention_layers if "linear_num_value_heads" in text else 0
+
+    return _architecture(
+        tensors,
+        source="safetensors",
+        model_type=text.get("model_type", config.get("model_type", "")),
+        layers=layers,
+        attention_layers=attention_layers,
+        kv_heads=text.get("num_key_value_heads", heads),
+        head_dim=text.get("head_dim") or text["hidden_size"] // heads,
+        linear_layers=linear_layers,
+        linear_key_heads=text.get("linear_num_key_heads", 0),
+        linear_value_heads=text.get("linear_num_value_heads", 0),
+        linear_head_dim=text.get("linear_key_head_dim", 0),
+        experts=text.get("num_experts") or text.get("num_local_experts") or text.get("n_routed_experts") or 0,
+        experts_used=text.get("num_experts_per_tok", 0),
+        max_context=text.get("max_position_embeddings", 0),
+    )
+
+
+def inspect_model(model_dir: str, gguf_pattern: str = "") -> dict:
+    """Architecture of the model in model_dir: its GGUF files matching gguf_pattern, else config.json."""
+    gguf = sorted(glob.glob(os.path.join(model_dir, "**", "*.gguf"), recursive=True))
+    gguf = [p for p in gguf if gguf_pattern in os.path.relpath(p, model_dir) and "mmproj" not in os.path.basename(p)]
+    if gguf:
+        return gguf_architecture(gguf)
+    return hf_architecture(model_dir)
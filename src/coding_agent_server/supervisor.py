@@ -0,0 +1,286 @@
+"""Supervisor for the inference engine process behind serve_coder / serve_vlm.
+
+Modal's web_server only waits for the port to accept connections. The
+supervisor starts the engine (vLLM or llama-server) and polls its /health
+until it is ready. It restarts the engine with exponential backoff when the
+process exits or stops answering /health. The engine's stdout and stderr
+are re-emitted as JSON log lines, one per line, so Modal's log search can
+filter them by engine and event. A StartupTimeline turns those events and
+the engine's own log milestones into a cold-start phase breakdown.
+
+Stdlib only: it is copied into both the vLLM and llama.cpp images next to
+config.py, and runs locally against a fake engine in tests.
+"""
+
+import json
+import os
+import re
+import socket
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from collections.abc import Callable
+
+HEALTH_POLL_INTERVAL = 2.0  # seconds between /health probes
+HEALTH_TIMEOUT = 5.0  # timeout of one /health probe
+UNHEALTHY_AFTER = 3  # consecutive failed probes of a ready engine before it is restarted
+INITIAL_BACKOFF = 1.0  # first restart delay; doubles per consecutive crash
+MAX_BACKOFF = 60.0
+STABLE_AFTER = 300.0  # an engine healthy this long resets the backoff
+MAX_STARTUP_RESTARTS = 3  # crashes before the first ready that make wait_ready give up
+LOG_TAIL_LINES = 50  # engine output kept for error messages
+
+# Engine log lines that end a cold-start phase, as (mark, pattern); the first match wins
+VLLM_MILESTONES = [
+    ("weights_loaded", re.compile(r"Model loading took|Loading weights took")),
+    ("compiled", re.compile(r"torch\.compile takes|Directly load the compiled graph")),
+    ("kv_cache_allocated", re.compile(r"GPU KV cache size")),
+    ("cuda_graphs_captured", re.compile(r"Graph capturing finished")),
+    ("engine_initialized", re.compile(r"init engine .* took")),
+    ("server_listening", re.compile(r"Application startup complete")),
+]
+LLAMACPP_MILESTONES = [
+    ("metadata_read", re.compile(r"llama_model_loader: loaded meta data")),
+    ("weights_loaded", re.compile(r"llama_context: constructing|llama_new_context_with_model")),
+    ("kv_cache_allocated", re.compile(r"llama_kv_cache")),
+    ("engine_initialized", re.compile(r"main: model loaded")),
+    ("server_listening", re.compile(r"server is listening")),
+]
+
+
+def emit(engine: str, event: str, **fields) -> dict:
+    """Print one structured log line to stdout and return it."""
+    record = {"ts": round(time.time(), 3), "engine": engine, "event": event, **fields}
+    print(json.dumps(record), flush=True)
+    return record
+
+
+class EngineSupervisor:
+    """Run one engine command, gate readiness on its /health and restart it when it dies.
+
+    start() launches the engine and a monitor thread and returns at once;
+    wait_ready() blocks until the first successful /health probe, or raises
+    if the engine keeps crashing during startup. After that the monitor keeps
+    restarting the engine, with backoff, for the life of the container.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        cmd: list[str],
+        health_url: str,
+        env: dict[str, str] | None = None,
+        poll_interval: float = HEALTH_POLL_INTERVAL,
+        initial_backoff: float = INITIAL_BACKOFF,
+        max_backoff: float = MAX_BACKOFF,
+        max_startup_restarts: int = MAX_STARTUP_RESTARTS,
+        on_event: Callable[[dict], None] | None = None,
+    ):
+        self.name = name
+        self.cmd = cmd
+        self.health_url = health_url
+        self.env = env
+        self.poll_interval = poll_interval
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.max_startup_restarts = max_startup_restarts
+        self.on_event = on_event
+        self.process: subprocess.Popen | None = None
+        self.started_at = 0.0  # monotonic time of start()
+        self.ready_seconds: float | None = None  # start() to first healthy probe
+        self.restarts = 0
+        self.tail: deque[str] = deque(maxlen=LOG_TAIL_LINES)
+        self._ready = threading.Event()
+        self._failed: str | None = None
+        self._stop = threading.Event()
+        self._monitor: threading.Thread | None = None
+
+    def start(self) -> None:
+        self.started_at = time.monotonic()
+        self._launch()
+        self._monitor = threading.Thread(target=self._run, name=f"{self.name}-supervisor", daemon=True)
+        self._monitor.start()
+
+    def wait_ready(self, timeout: float) -> float:
+        """Block until the engine is healthy; return its load time in seconds."""
+        deadline = time.monotonic() + timeout
+        while not self._ready.wait(min(0.1, max(0.0, deadline - time.monotonic()))):
+            if self._failed:
+                raise RuntimeError(f"{self.name} failed to start: {self._failed}\n" + "\n".join(self.tail))
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"{self.name} not ready after {timeout:.0f}s\n" + "\n".join(self.tail))
+        return self.ready_seconds
+
+    def stop(self, grace: float = 10.0) -> None:
+        self._stop.set()
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(grace)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self._monitor is not None:
+            self._monitor.join(grace)
+
+    def _event(self, event: str, **fields) -> None:
+        record = emit(self.name, event, **fields)
+        if self.on_event is not None:
+            self.on_event(record)
+
+    def _launch(self) -> None:
+        self.process = subprocess.Popen(
+            self.cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env={**os.environ, **self.env} if self.env else None,
+            text=True,
+            bufsize=1,
+        )
+        self._event("spawn", pid=self.process.pid, restarts=self.restarts, cmd=self.cmd)
+        threading.Thread(
+            target=self._pump, args=(self.process,), name=f"{self.name}-log", daemon=True
+        ).start()
+
+    def _pump(self, process: subprocess.Popen) -> None:
+        """Re-emit the engine's output line by line as structured log records."""
+        for line in process.stdout:
+            line = line.rstrip()
+            if line:
+                self.tail.append(line)
+                self._event("log", pid=process.pid, line=line)
+
+    def _healthy(self) -> bool:
+        try:
+            with urllib.request.urlopen(self.health_url, timeout=HEALTH_TIMEOUT) as resp:
+                return resp.status == 200
+        except (urllib.error.URLError, OSError):
+            return False
+
+    def _run(self) -> None:
+        backoff = self.initial_backoff
+        healthy_since: float | None = None
+        failed_probes = 0
+        while not self._stop.is_set():
+            code = self.process.poll()
+            if code is None:
+                if self._healthy():
+                    failed_probes = 0
+                    if healthy_since is None:
+                        healthy_since = time.monotonic()
+                        self._became_ready()
+                    elif time.monotonic() - healthy_since > STABLE_AFTER:
+                        backoff = self.initial_backoff
+                elif healthy_since is not None:
+                    failed_probes += 1
+                    if failed_probes >= UNHEALTHY_AFTER:
+                        self._event("unhealthy", pid=self.process.pid, failed_probes=failed_probes)
+                        self.process.kill()
+                        self.process.wait()
+                        code = self.process.returncode
+                if code is None:
+                    self._stop.wait(self.poll_interval)
+                    continue
+
+            self._event("exit", pid=self.process.pid, returncode=code, was_ready=healthy_since is not None)
+            healthy_since, failed_probes = None, 0
+            if not self._ready.is_set() and self.restarts >= self.max_startup_restarts:
+                self._failed = f"exited with code {code} after {self.restarts} restarts"
+                self._event("give_up", returncode=code, restarts=self.restarts)
+                return
+            self._event("restart", in_seconds=backoff)
+            if self._stop.wait(backoff):
+                return
+            backoff = min(backoff * 2, self.max_backoff)
+            self.restarts += 1
+            self._launch()
+
+    def _became_ready(self) -> None:
+        if not self._ready.is_set():
+            self.ready_seconds = time.monotonic() - self.started_at
+            self._event("ready", pid=self.process.pid, load_seconds=round(self.ready_seconds, 2))
+            self._ready.set()
+        else:
+            self._event("recovered", pid=self.process.pid, restarts=self.restarts)
+
+
+
+def container_started_at() -> float | None:
+    """Wall time the container's first process started, from /proc; None where unavailable.
+
+    /proc/stat's boot time has one-second resolution, so this is approximate.
+    """
+    try:
+        with open("/proc/1/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+    return boot + start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+class StartupTimeline:
+    """Timestamped cold-start marks for one engine container, written out as JSON.
+
+    Marks are wall times: container_start (from /proc, where available) and
+    function_start are taken at construction, the caller adds its own with
+    mark(), and observe() - an EngineSupervisor on_event callback - adds
+    engine_spawned, the first log line matching each milestone, and ready.
+    Each phase is named after the mark that ends it and lasts from the
+    previous mark, so the phases add up to the container's time to ready.
+    """
+
+    def __init__(self, engine: str, milestones: list[tuple[str, re.Pattern]], **info):
+        self.engine = engine
+        self.milestones = milestones
+        self.info = info
+        self.marks: dict[str, float] = {}
+        now = time.time()
+        started = container_started_at()
+        if started is not None and 0 <= now - started < 3600:
+            self.marks["container_start"] = started
+        self.marks["function_start"] = now
+
+    def mark(self, name: str, ts: float | None = None) -> None:
+        """Record when `name` happened (default: now); only its first occurrence counts."""
+        self.marks.setdefault(name, time.time() if ts is None else ts)
+
+    def observe(self, record: dict) -> None:
+        event = record["event"]
+        if event == "spawn":
+            self.mark("engine_spawned", record["ts"])
+        elif event == "ready":
+            self.mark("ready", record["ts"])
+        elif event == "log":
+            for name, pattern in self.milestones:
+                if name not in self.marks and pattern.search(record["line"]):
+                    self.mark(name, record["ts"])
+
+    def phases(self) -> dict[str, float]:
+        """Seconds per phase, in the order the phases ended."""
+        ordered = sorted(self.marks.items(), key=lambda mark: mark[1])
+        return {name: round(ts - prev, 3) for (_, prev), (name, ts) in zip(ordered, ordered[1:])}
+
+    def to_dict(self) -> dict:
+        return {
+            "engine": self.engine,
+            "host": socket.gethostname(),
+            **self.info,
+            "marks": {name: round(ts, 3) for name, ts in self.marks.items()},
+            "phases": self.phases(),
+        }
+
+    def write(self, directory: str) -> str:
+        """Write the timeline to directory/<engine>/<function start>-<host>.json; return its path."""
+        engine_dir = os.path.join(directory, self.engine)
+        os.makedirs(engine_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(self.marks["function_start"]))
+        path = os.path.join(engine_dir, f"{stamp}-{socket.gethostname()}.json")
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        emit(self.engine, "timeline", path=path, phases=self.phases())
+        return path
@@ -0,0 +1,59 @@
+"""Tests for the KV-cache capacity planner.
+
+Usage:
+    pytest tests/test_capacity.py -v
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "coding_agent_server"))
+import capacity  # noqa: E402
+
+DENSE = {"params_b": 8, "layers": 32, "attention_layers": 32, "kv_heads": 8, "head_dim": 128, "max_context": 131072}
+HYBRID = {
+    "params_b": 80, "layers": 48, "attention_layers": 12, "kv_heads": 2, "head_dim": 256,
+    "linear_layers": 36, "linear_key_heads": 16, "linear_value_heads": 32, "linear_head_dim": 128,
+    "max_context": 262144,
+}
+
+
+def _entry(arch: dict, quantization: str = "BF16", gpu_type: str = "A100-80GB", n_gpu: int = 1, **extra) -> dict:
+    return {"arch": arch, "quantization": quantization, "gpu_type": gpu_type, "n_gpu": n_gpu, **extra}
+
+
+def test_kv_bytes_count_only_full_attention_layers():
+    assert capacity.kv_bytes_per_token(DENSE, 2) == 2 * 32 * 8 * 128 * 2  # 128 KiB, like Llama-3-8B
+    assert capacity.kv_bytes_per_token(HYBRID, 1) == 2 * 12 * 2 * 256
+    assert capacity.state_bytes_per_sequence(DENSE) == 0
+    assert capacity.state_bytes_per_sequence(HYBRID) > 36 * 32 * 128 * 128 * 2  # recurrent state plus conv state
+
+
+def test_plan_is_bounded_by_memory_left_after_weights():
+    plan = capacity.plan_capacity("dense", _entry(DENSE), "vllm", "auto", 0.9)
+
+    expected_kv = (79.1 * 0.9 - capacity.RESERVE_GIB_PER_GPU) * capacity.GIB - 8e9 * 2
+    assert plan.weights_gib == pytest.approx(8e9 * 2 / capacity.GIB)
+    assert plan.kv_capacity_gib * capacity.GIB == pytest.approx(expected_kv)
+    assert plan.max_context == 131072  # capped at the native context
+    assert plan.concurrency == int(expected_kv // (128 * 1024 * capacity.TYPICAL_CONTEXT_TOKENS))
+    assert capacity.plan_capacity("dense", _entry(DENSE), "vllm", "fp8", 0.9).concurrency > plan.concurrency
+
+
+def test_plan_that_does_not_fit_has_no_context():
+    plan = capacity.plan_capacity("hybrid", _entry(HYBRID, "FP8"), "vllm", "fp8", 0.9)
+
+    assert not plan.fits and plan.max_context == 0 and plan.concurrency == 0
+    assert "leave no room" in plan.summary()
+    assert capacity.plan_capacity("hybrid", _entry(HYBRID, "FP8", "H200"), "vllm", "fp8", 0.9).fits
+
+
+def test_llamacpp_plan_uses_f16_kv_and_its_context_pool():
+    entry = _entry(HYBRID, "GGUF", gguf_pattern="UD-IQ2_XXS")
+    plan = capacity.plan_capacity("hybrid", entry, "llamacpp", "fp8", 0.9)
+
+    assert plan.weights_gib == pytest.approx(80e9 * 2.32 / 8 / capacity.GIB)
+    assert plan.kv_bytes_per_token == 2 * 12 * 2 * 256 * 2
+    assert plan.concurrency == plan.max_context // capacity.TYPICAL_CONTEXT_TOKENS
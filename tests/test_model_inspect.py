@@ -0,0 +1,168 @@
+"""Tests for the GGUF / safetensors header reader, on small synthetic model files.
+
+Usage:
+    pytest tests/test_model_inspect.py -v
+"""
+
+import json
+import struct
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "coding_agent_server"))
+import capacity  # noqa: E402
+import model_inspect  # noqa: E402
+
+
+def _gguf_string(s: str) -> bytes:
+    data = s.encode()
+    return struct.pack("<Q", len(data)) + data
+
+
+def _gguf_value(value) -> tuple[int, bytes]:
+    if isinstance(value, bool):
+        return 7, struct.pack("<?", value)
+    if isinstance(value, int):
+        return 4, struct.pack("<I", value)
+    if isinstance(value, float):
+        return 6, struct.pack("<f", value)
+    if isinstance(value, str):
+        return 8, _gguf_string(value)
+    kinds, payloads = zip(*(_gguf_value(v) for v in value))
+    return 9, struct.pack("<IQ", kinds[0], len(value)) + b"".join(payloads)
+
+
+def _write_gguf(path: Path, metadata: dict, tensors: dict[str, tuple[list[int], int]], alignment: int = 32) -> None:
+    """A GGUF v3 file whose tensors are (shape, byte size) with zeroed data."""
+    header = b"GGUF" + struct.pack("<IQQ", 3, len(tensors), len(metadata))
+    for key, value in metadata.items():
+        kind, payload = _gguf_value(value)
+        header += _gguf_string(key) + struct.pack("<I", kind) + payload
+    offset, data = 0, b""
+    for name, (shape, size) in tensors.items():
+        header += _gguf_string(name) + struct.pack(f"<I{len(shape)}QIQ", len(shape), *shape, 0, offset)
+        padded = (size + alignment - 1) // alignment * alignment
+        data += bytes(padded)
+        offset += padded
+    header += bytes(-len(header) % alignment)
+    path.write_bytes(header + data)
+
+
+def _hybrid_tensors(layers: int = 4, interval: int = 4) -> dict[str, tuple[list[int], int]]:
+    tensors = {"token_embd.weight": ([64, 100], 6400)}
+    for i in range(layers):
+        if (i + 1) % interval:
+            tensors[f"blk.{i}.ssm_a"] = ([8], 32)
+            tensors[f"blk.{i}.attn_qkv.weight"] = ([64, 192], 4096)
+        else:
+            tensors[f"blk.{i}.attn_k.weight"] = ([64, 32], 1024)
+            tensors[f"blk.{i}.attn_q.weight"] = ([64, 64], 2048)
+        tensors[f"blk.{i}.ffn_gate_exps.weight"] = ([64, 32, 8], 8192)
+    return tensors
+
+
+HYBRID_METADATA = {
+    "general.architecture": "qwen3next",
+    "general.name": "tiny",
+    "qwen3next.block_count": 4,
+    "qwen3next.context_length": 262144,
+    "qwen3next.embedding_length": 64,
+    "qwen3next.attention.head_count": 4,
+    "qwen3next.attention.head_count_kv": 2,
+    "qwen3next.attention.key_length": 16,
+    "qwen3next.expert_count": 8,
+    "qwen3next.expert_used_count": 2,
+    "qwen3next.ssm.state_size": 16,
+    "qwen3next.ssm.group_count": 2,
+    "qwen3next.ssm.time_step_rank": 4,
+    "qwen3next.rope.freq_base": 10000000.0,
+    "tokenizer.ggml.tokens": [f"t{i}" for i in range(model_inspect.MAX_ARRAY_ITEMS + 1)],
+    "tokenizer.ggml.add_bos_token": False,
+}
+
+
+def test_read_gguf_parses_metadata_and_tensor_table(tmp_path):
+    path = tmp_path / "tiny.gguf"
+    _write_gguf(path, HYBRID_METADATA, {"a.weight": ([4, 8], 64), "b.weight": ([3], 10)})
+
+    parsed = model_inspect.read_gguf(str(path))
+
+    meta = parsed["metadata"]
+    assert meta["general.architecture"] == "qwen3next"
+    assert meta["qwen3next.rope.freq_base"] == 10000000.0
+    assert meta["tokenizer.ggml.add_bos_token"] is False
+    assert "tokenizer.ggml.tokens" not in meta  # too long to keep
+    assert parsed["tensors"]["a.weight"]["shape"] == [4, 8]
+    # bytes run to the next tensor (or the end of the file), so they include alignment padding
+    assert parsed["tensors"]["a.weight"]["bytes"] == 64
+    assert parsed["tensors"]["b.weight"]["bytes"] == 32
+
+
+def test_read_gguf_rejects_other_files(tmp_path):
+    path = tmp_path / "model.gguf"
+    path.write_bytes(b"PK\x03\x04" + bytes(64))
+
+    with pytest.raises(ValueError, match="not a GGUF file"):
+        model_inspect.read_gguf(str(path))
+
+
+def test_inspect_sharded_gguf_counts_attention_and_linear_layers(tmp_path):
+    tensors = list(_hybrid_tensors(layers=8).items())
+    shard_dir = tmp_path / "UD-IQ2_XXS"
+    shard_dir.mkdir()
+    first_shard_metadata = HYBRID_METADATA | {"qwen3next.block_count": 8}
+    _write_gguf(shard_dir / "tiny-00001-of-00002.gguf", first_shard_metadata, dict(tensors[:10]))
+    _write_gguf(shard_dir / "tiny-00002-of-00002.gguf", {"split.no": 1}, dict(tensors[10:]))
+    _write_gguf(tmp_path / "mmproj-F16.gguf", {"general.architecture": "clip"}, {"v.weight": ([4], 8)})
+
+    arch = model_inspect.inspect_model(str(tmp_path), "UD-IQ2_XXS")
+
+    assert arch["source"] == "gguf" and arch["model_type"] == "qwen3next"
+    assert (arch["layers"], arch["attention_layers"], arch["linear_layers"]) == (8, 2, 6)
+    assert (arch["kv_heads"], arch["head_dim"], arch["max_context"]) == (2, 16, 262144)
+    assert (arch["experts"], arch["experts_used"]) == (8, 2)
+    assert (arch["linear_key_heads"], arch["linear_value_heads"], arch["linear_head_dim"]) == (2, 4, 16)
+    assert len(arch["tensor_bytes"]) == len(tensors) and "v.weight" not in arch["tensor_bytes"]
+    assert arch["weights_bytes"] == sum(arch["tensor_bytes"].values())
+
+
+def test_inspect_safetensors_checkpoint_reads_config_and_headers(tmp_path):
+    config = {
+        "model_type": "qwen3_vl",
+        "text_config": {
+            "model_type": "qwen3_vl_text",
+            "num_hidden_layers": 4,
+            "num_attention_heads": 8,
+            "num_key_value_heads": 2,
+            "hidden_size": 512,
+            "max_position_embeddings": 32768,
+            "layer_types": ["linear_attention", "full_attention"] * 2,
+            "linear_num_value_heads": 4,
+        },
+    }
+    (tmp_path / "config.json").write_text(json.dumps(config))
+    for i, names in enumerate([["w0", "w1"], ["w2"]]):
+        header = {"__metadata__": {"format": "pt"}}
+        offset = 0
+        for name in names:
+            header[name] = {"dtype": "F8_E4M3", "shape": [10, 100], "data_offsets": [offset, offset + 1000]}
+            offset += 1000
+        raw = json.dumps(header).encode()
+        (tmp_path / f"model-0000{i + 1}.safetensors").write_bytes(struct.pack("<Q", len(raw)) + raw + bytes(offset))
+
+    arch = model_inspect.inspect_model(str(tmp_path))
+
+    assert arch["source"] == "safetensors" and arch["model_type"] == "qwen3_vl_text"
+    assert (arch["attention_layers"], arch["linear_layers"], arch["kv_heads"], arch["head_dim"]) == (2, 2, 2, 64)
+    assert arch["weights_bytes"] == 3000 and arch["params_b"] == round(3000 / 1e9, 2)
+
+
+def test_measured_weights_replace_the_estimate_in_the_plan(tmp_path):
+    _write_gguf(tmp_path / "tiny.gguf", HYBRID_METADATA, _hybrid_tensors())
+    arch = model_inspect.inspect_model(str(tmp_path))
+    entry = {"arch": {"params_b": 80, **arch}, "quantization": "GGUF", "gpu_type": "A100-80GB", "n_gpu": 1}
+
+    assert capacity.weight_bytes(entry) == arch["weights_bytes"]
+    assert capacity.min_gpus("tiny", entry, "llamacpp", "fp8", 0.9) == 1
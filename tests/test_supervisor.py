@@ -0,0 +1,144 @@
+"""Tests for the engine supervisor, against a local fake engine process.
+
+Usage:
+    pytest tests/test_supervisor.py -v
+"""
+
+import json
+import re
+import socket
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src" / "coding_agent_server"))
+import supervisor  # noqa: E402
+
+# Serves /health after LOAD seconds; crashes after CRASH_AFTER seconds on its
+# first run only (a marker file remembers the crash), like an engine OOM.
+FAKE_ENGINE = textwrap.dedent("""
+    import http.server, os, sys, threading, time
+
+    port, load, crash_after, marker = int(sys.argv[1]), float(sys.argv[2]), float(sys.argv[3]), sys.argv[4]
+    print("loading weights", flush=True)
+    time.sleep(load)
+    if crash_after < 0:
+        print("CUDA out of memory", flush=True)
+        sys.exit(3)
+
+    class Health(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200 if self.path == "/health" else 404)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(("127.0.0.1", port), Health)
+    print("server ready", flush=True)
+    if crash_after > 0 and not os.path.exists(marker):
+        open(marker, "w").close()
+        threading.Timer(crash_after, lambda: os._exit(1)).start()
+    server.serve_forever()
+""")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    script = tmp_path / "fake_engine.py"
+    script.write_text(FAKE_ENGINE)
+    port = _free_port()
+    events: list[dict] = []
+    started: list[supervisor.EngineSupervisor] = []
+
+    def make(load: float = 0.2, crash_after: float = 0.0) -> supervisor.EngineSupervisor:
+        cmd = [sys.executable, str(script), str(port), str(load), str(crash_after), str(tmp_path / "crashed")]
+        sup = supervisor.EngineSupervisor(
+            "fake",
+            cmd,
+            f"http://127.0.0.1:{port}/health",
+            poll_interval=0.05,
+            initial_backoff=0.05,
+            on_event=events.append,
+        )
+        started.append(sup)
+        return sup
+
+    make.events = events
+    yield make
+    for sup in started:
+        sup.stop(grace=2)
+
+
+def _kinds(events: list[dict]) -> list[str]:
+    return [e["event"] for e in events if e["event"] != "log"]
+
+
+def test_wait_ready_gates_on_health_and_records_load_time(engine):
+    sup = engine(load=0.3)
+    sup.start()
+
+    load_seconds = sup.wait_ready(timeout=10)
+
+    assert load_seconds >= 0.3
+    assert _kinds(engine.events) == ["spawn", "ready"]
+    lines = [e["line"] for e in engine.events if e["event"] == "log"]
+    assert lines[:2] == ["loading weights", "server ready"]
+    assert all(e["engine"] == "fake" and "ts" in e for e in engine.events)
+
+
+def test_startup_timeline_marks_engine_milestones_and_is_written(engine, tmp_path):
+    milestones = [("weights_loading", re.compile(r"loading weights")), ("server_listening", re.compile(r"server ready"))]
+    timeline = supervisor.StartupTimeline("fake", milestones, model="fake-model")
+    sup = engine(load=0.3)
+    sup.on_event = timeline.observe
+    timeline.mark("volume_ready")
+    sup.start()
+    sup.wait_ready(timeout=10)
+
+    path = timeline.write(str(tmp_path / "timelines"))
+
+    written = json.loads(Path(path).read_text())
+    assert Path(path).parent.name == "fake" and written["model"] == "fake-model"
+    phases = list(written["phases"])
+    assert phases[-4:] == ["engine_spawned", "weights_loading", "server_listening", "ready"]
+    assert written["phases"]["server_listening"] >= 0.3  # the fake engine's load time
+    marks = written["marks"]
+    assert sum(written["phases"].values()) == pytest.approx(marks["ready"] - min(marks.values()), abs=0.01)
+
+
+def test_crashed_engine_is_restarted_and_recovers(engine):
+    sup = engine(crash_after=0.3)
+    sup.start()
+    sup.wait_ready(timeout=10)
+
+    deadline = time.monotonic() + 10
+    while "recovered" not in _kinds(engine.events) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert _kinds(engine.events) == ["spawn", "ready", "exit", "restart", "spawn", "recovered"]
+    assert sup.restarts == 1
+    exit_event = next(e for e in engine.events if e["event"] == "exit")
+    assert exit_event["returncode"] == 1 and exit_event["was_ready"]
+
+
+def test_engine_crashing_during_startup_fails_with_its_log_tail(engine):
+    sup = engine(load=0.0, crash_after=-1)
+    sup.max_startup_restarts = 2
+    sup.start()
+
+    with pytest.raises(RuntimeError, match="exited with code 3 after 2 restarts") as exc_info:
+        sup.wait_ready(timeout=10)
+
+    assert "CUDA out of memory" in str(exc_info.value)
+    assert _kinds(engine.events).count("spawn") == 3
+    assert _kinds(engine.events)[-1] == "give_up"